@@ -0,0 +1,251 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from artifacts import StaleArtifactError, check_artifact_version, load_artifact_bundle
+from similarity import SimilarityIndex, normalize_rows, top_k
+
+# Configuration
+MODEL_DIR = "backend/artifacts"
+IVF_FILENAME = "ivf_index.npz"
+NPROBE = 8
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLE_SIZE = 100_000
+ASSIGN_CHUNK_SIZE = 65_536
+
+
+def default_nlist(n_rows):
+    # Common rule of thumb for IVF: a few times sqrt(n) coarse cells
+    return max(1, min(n_rows, int(4 * np.sqrt(n_rows))))
+
+
+def assign_to_centroids(vectors, centroids):
+    # Nearest centroid (max inner product) per row, chunked so we never hold
+    # a full n x nlist score matrix for very large catalogs
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_SIZE):
+        chunk = vectors[start:start + ASSIGN_CHUNK_SIZE]
+        assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors, n_clusters, n_iter=KMEANS_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # Re-seed empty clusters from random rows so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index.
+
+    A spherical k-means coarse quantizer splits the normalized embeddings into
+    `nlist` cells. A query only scores the rows in its `nprobe` closest cells,
+    so `nprobe` trades recall for latency. Queries whose probed cells hold
+    fewer than k usable rows fall back to an exact scan.
+    """
+
+    def __init__(self, vectors, centroids, list_offsets, list_ids, nprobe=NPROBE):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, nlist=None, nprobe=NPROBE, seed=0):
+        vectors = normalize_rows(vectors)
+        nlist = nlist or default_nlist(len(vectors))
+
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > KMEANS_SAMPLE_SIZE:
+            sample = vectors[rng.choice(len(vectors), KMEANS_SAMPLE_SIZE, replace=False)]
+        centroids = spherical_kmeans(sample, nlist, seed=seed)
+        return cls.from_centroids(vectors, centroids, nprobe=nprobe)
+
+    @classmethod
+    def from_centroids(cls, vectors, centroids, nprobe=NPROBE):
+        # Fill the inverted lists for existing centroids; used both after
+        # k-means and to add rows incrementally without re-clustering
+        vectors = normalize_rows(vectors)
+        nlist = len(centroids)
+        assignments = assign_to_centroids(vectors, centroids)
+        list_ids = np.argsort(assignments, kind="stable").astype(np.int32)
+        counts = np.bincount(assignments, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(vectors, centroids, list_offsets, list_ids, nprobe=nprobe)
+
+    def save(self, path, version=None):
+        # `version`: the bundle the vectors came from, checked on load
+        np.savez(
+            path,
+            version=np.array(version or ""),
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_ids=self.list_ids,
+            nprobe=np.int64(self.nprobe),
+        )
+
+    @classmethod
+    def load(cls, path, vectors, version=None):
+        # `vectors` must be the same normalized matrix the index was built
+        # from; with `version`, an index built for another bundle is rejected
+        with np.load(path) as data:
+            check_artifact_version("IVF index", str(data["version"]) if "version" in data else None, version)
+            index = cls(
+                vectors,
+                data["centroids"],
+                data["list_offsets"],
+                data["list_ids"],
+                nprobe=int(data["nprobe"]),
+            )
+        if index.list_offsets[-1] != len(vectors):
+            raise ValueError(
+                f"IVF index covers {index.list_offsets[-1]} rows but embeddings have {len(vectors)}"
+            )
+        return index
+
+    def candidates(self, cell_ids):
+        return np.concatenate(
+            [self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in cell_ids]
+        )
+
+    def search_batch(self, queries, k, exclude=None, nprobe=None, mask=None):
+        # `mask` (see filters.py) is applied to each probed cell's rows
+        queries = normalize_rows(queries)
+        probes = top_k(queries @ self.centroids.T, nprobe or self.nprobe)
+
+        all_indices = []
+        all_scores = []
+        for row, query in enumerate(queries):
+            ids = self.candidates(probes[row])
+            if mask is not None:
+                ids = ids[mask[ids]]
+            excluded = None if exclude is None else exclude[row]
+            if excluded is not None:
+                ids = ids[~np.isin(ids, excluded)]
+            if len(ids) < k:
+                # Not enough rows in the probed cells: scan every qualifying row
+                ids = np.arange(len(self.vectors)) if mask is None else np.flatnonzero(mask)
+                if excluded is not None:
+                    ids = ids[~np.isin(ids, excluded)]
+            scores = self.vectors[ids] @ query
+            best = top_k(scores, k)
+            all_indices.append(ids[best].astype(np.int64))
+            all_scores.append(scores[best].astype(np.float32))
+        # One array per query (see SimilarityIndex.search_batch)
+        return all_indices, all_scores
+
+
+def load_ivf_index(model_dir, vectors, version=None):
+    # Returns None when no index has been built, or it is stale, so callers
+    # use exact search
+    path = os.path.join(model_dir, IVF_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        return IVFIndex.load(path, vectors, version=version)
+    except StaleArtifactError as e:
+        print(f"Ignoring stale index: {e}; rebuild with python backend/ann_index.py build")
+        return None
+
+
+def rebuild_ivf_index(model_dir, vectors, version):
+    """Re-cluster an existing index for new vectors (e.g. after a retrain).
+
+    Keeps its list count and nprobe; does nothing when no index was built.
+    """
+    path = os.path.join(model_dir, IVF_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        nlist, nprobe = len(data["centroids"]), int(data["nprobe"])
+    index = IVFIndex.build(vectors, nlist=min(nlist, len(vectors)), nprobe=nprobe)
+    index.save(path, version=version)
+    return index
+
+
+def recall_report(vectors, ann, k=10, n_queries=500, nprobes=(1, 2, 4, 8, 16, 32), seed=0):
+    """Recall@k and mean latency of `ann` against exact search.
+
+    Queries are random catalog rows (excluding themselves). Many movies share
+    identical embeddings, so recall is tie-aware: an ANN hit counts if its
+    score reaches the exact k-th best score.
+    """
+    exact = SimilarityIndex(vectors)
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+
+    start = time.perf_counter()
+    exact_scores = [exact.search_by_id(i, k)[1] for i in query_ids]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(query_ids)
+
+    rows = []
+    for nprobe in nprobes:
+        if nprobe > ann.nlist:
+            continue
+        hits = 0
+        start = time.perf_counter()
+        results = [
+            ann.search_batch(exact.vectors[i][None, :], k, exclude=[[i]], nprobe=nprobe)[1][0]
+            for i in query_ids
+        ]
+        ann_ms = (time.perf_counter() - start) * 1000 / len(query_ids)
+        for found, truth in zip(results, exact_scores):
+            hits += int(np.sum(found >= truth[-1] - 1e-6))
+        rows.append({
+            "nprobe": nprobe,
+            "recall": hits / (k * len(query_ids)),
+            "latency_ms": ann_ms,
+            "exact_latency_ms": exact_ms,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and evaluate the IVF ANN index")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, default=NPROBE)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    bundle = load_artifact_bundle(MODEL_DIR, verify=False)
+    vectors = normalize_rows(bundle.embeddings)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = IVFIndex.build(vectors, nlist=args.nlist, nprobe=args.nprobe)
+        index.save(os.path.join(MODEL_DIR, IVF_FILENAME), version=bundle.version)
+        print(f"Built IVF index with {index.nlist} lists in {time.perf_counter() - start:.1f}s")
+        return
+
+    index = load_ivf_index(MODEL_DIR, vectors, version=bundle.version)
+    if index is None:
+        print("No IVF index found, building a temporary one...")
+        index = IVFIndex.build(vectors, nlist=args.nlist, nprobe=args.nprobe)
+    print(f"nlist={index.nlist}, k={args.k}, queries={args.queries}")
+    print(f"{'nprobe':>6} {'recall@k':>9} {'ann ms':>8} {'exact ms':>9}")
+    for row in recall_report(vectors, index, k=args.k, n_queries=args.queries):
+        print(f"{row['nprobe']:>6} {row['recall']:>9.3f} {row['latency_ms']:>8.3f} {row['exact_latency_ms']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from catalog import Catalog
+from similarity import normalize_rows
+
+# Configuration
+MODEL_DIR = "backend/artifacts"
+BUNDLE_DIRNAME = "bundle"
+MANIFEST_FILENAME = "manifest.json"
+FORMAT_VERSION = 1
+BUNDLE_LOAD_ATTEMPTS = 3 # Loads retried when a publish removes the bundle being read
+MODEL_FILES = ("model.pt", "tfidf.pkl", "mlb.pkl", "scaler.pkl") # Loaded lazily by plot queries, checksummed in the manifest
+
+
+class StaleArtifactError(ValueError):
+    """A derived artifact (index, table) was built for another bundle version."""
+
+
+def check_artifact_version(name, stored, expected):
+    # Derived artifacts record the bundle version they were built from; an
+    # expected version of None skips the check (ad-hoc builds, benchmarks)
+    if expected is not None and stored != expected:
+        raise StaleArtifactError(f"{name} was built for artifacts {stored or 'unknown'}, serving {expected}")
+
+
+class ArtifactBundle:
+    """Embeddings and catalog metadata served by the API.
+
+    Loaded from the memory-mapped bundle when present, so worker processes
+    share the pages through the OS page cache, or from the legacy pickles.
+    """
+
+    def __init__(self, embeddings, catalog, version, normalized=False, manifest=None, content_hashes=None):
+        self.embeddings = embeddings
+        self.catalog = catalog
+        self.version = version
+        self.normalized = normalized
+        self.manifest = manifest or {}
+        # Per-row content hashes (see catalog.content_hash), when recorded
+        self.content_hashes = content_hashes
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def model_file_checksums(model_dir):
+    # The encoder and preprocessors live next to the bundle, not in it; the
+    # manifest records them so a lazy load can tell they were swapped since
+    return {
+        name: {"sha256": _sha256(path), "bytes": os.path.getsize(path)}
+        for name in MODEL_FILES
+        if os.path.exists(path := os.path.join(model_dir, name))
+    }
+
+
+def verify_model_files(model_dir, expected, checksums=True):
+    """Raise ValueError when the model files differ from the manifest record.
+
+    `expected` is the manifest's "model_files" entry; None (bundles written
+    before it was recorded, legacy pickles) skips the check. Without
+    checksums only the sizes are compared.
+    """
+    if expected is None:
+        return
+    for name, info in expected.items():
+        path = os.path.join(model_dir, name)
+        if not os.path.exists(path):
+            raise ValueError(f"{name} is missing")
+        if os.path.getsize(path) != info["bytes"] or (checksums and _sha256(path) != info["sha256"]):
+            raise ValueError(f"{name} does not match the artifact bundle; reload to pick up the retrained model")
+
+
+def _bundle_version(files):
+    # One id for the whole bundle, derived from every file's checksum
+    digest = hashlib.sha256()
+    for name in sorted(files):
+        digest.update(f"{name}:{files[name]['sha256']}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+def stage_bundle(model_dir, embeddings, catalog, content_hashes=None, extra_manifest=None):
+    """Write embeddings + catalog columns as .npy files with a manifest.
+
+    Embeddings are stored L2-normalized as float32 so the similarity index can
+    use the mmap directly. The bundle is written to a new directory next to
+    the published one; returns (manifest, staged dir). The model files already in `model_dir`
+    are checksummed into the manifest. The version is known from here on, so
+    derived indexes can be built for it before `publish_bundle` swaps the
+    bundle into place.
+    """
+    if len(embeddings) != len(catalog):
+        raise ValueError(f"{len(embeddings)} embeddings for {len(catalog)} catalog rows")
+
+    # Unique name: it stays the bundle's directory once published
+    os.makedirs(model_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f"{BUNDLE_DIRNAME}-", dir=model_dir)
+    os.chmod(tmp_dir, 0o755)
+
+    arrays = {"embeddings": normalize_rows(embeddings), **catalog.arrays()}
+    if content_hashes is not None:
+        arrays["content_hash"] = np.asarray(content_hashes, dtype=np.uint64)
+    files = {}
+    for name, array in arrays.items():
+        path = os.path.join(tmp_dir, f"{name}.npy")
+        np.save(path, np.ascontiguousarray(array))
+        files[name] = {"sha256": _sha256(path), "bytes": os.path.getsize(path)}
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "version": _bundle_version(files),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "rows": len(catalog),
+        "embedding_dim": int(arrays["embeddings"].shape[1]),
+        "embeddings_normalized": True,
+        "industries": catalog.industries,
+        "files": files,
+        "model_files": model_file_checksums(model_dir),
+        **(extra_manifest or {}),
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_FILENAME), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest, tmp_dir
+
+
+def publish_bundle(model_dir, staged_dir):
+    # `bundle` is a symlink to the published directory. Replacing the link is
+    # one atomic rename, so readers see the old bundle or the new one, never
+    # a half-written one and never none at all
+    bundle_dir = os.path.join(model_dir, BUNDLE_DIRNAME)
+    previous = None
+    if os.path.islink(bundle_dir):
+        previous = os.path.realpath(bundle_dir)
+    elif os.path.exists(bundle_dir):
+        # Layout from before the symlink: move the directory aside once
+        previous = f"{bundle_dir}.old-{os.getpid()}"
+        os.rename(bundle_dir, previous)
+    link = f"{bundle_dir}.link-{os.getpid()}"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(staged_dir), link)
+    os.replace(link, bundle_dir)
+    # Processes that still map the old files keep them alive until they unmap
+    if previous is not None and previous != os.path.realpath(staged_dir):
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def write_bundle(model_dir, embeddings, catalog, content_hashes=None, extra_manifest=None):
+    # Stage and publish in one go, for callers with no derived indexes to build
+    manifest, staged_dir = stage_bundle(model_dir, embeddings, catalog, content_hashes, extra_manifest)
+    publish_bundle(model_dir, staged_dir)
+    return manifest
+
+
+def read_manifest(model_dir):
+    return _read_manifest(os.path.join(model_dir, BUNDLE_DIRNAME))
+
+
+def _read_manifest(bundle_dir):
+    path = os.path.join(bundle_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_bundle(model_dir, verify=True):
+    """Open the bundle with every array memory-mapped read-only.
+
+    Returns None when no bundle exists. Raises ValueError when the manifest
+    does not match the files (wrong format, row counts or checksums).
+    """
+    # Resolve the symlink once, so a publish during the load cannot mix the
+    # manifest of one bundle with the arrays of another
+    bundle_dir = os.path.realpath(os.path.join(model_dir, BUNDLE_DIRNAME))
+    manifest = _read_manifest(bundle_dir)
+    if manifest is None:
+        return None
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported artifact format {manifest.get('format_version')}")
+
+    arrays = {}
+    for name, info in manifest["files"].items():
+        path = os.path.join(bundle_dir, f"{name}.npy")
+        if verify and _sha256(path) != info["sha256"]:
+            raise ValueError(f"Checksum mismatch for {name}.npy; bundle is inconsistent")
+        arrays[name] = np.load(path, mmap_mode="r")
+
+    catalog = Catalog.from_arrays(arrays, manifest["industries"])
+    embeddings = arrays["embeddings"]
+    if embeddings.shape != (manifest["rows"], manifest["embedding_dim"]) or len(catalog) != manifest["rows"]:
+        raise ValueError(
+            f"Bundle has {embeddings.shape[0]} embeddings and {len(catalog)} catalog rows, "
+            f"manifest expects {manifest['rows']}"
+        )
+    return ArtifactBundle(
+        embeddings,
+        catalog,
+        manifest["version"],
+        normalized=manifest["embeddings_normalized"],
+        manifest=manifest,
+        content_hashes=arrays.get("content_hash"),
+    )
+
+
+def load_legacy_artifacts(model_dir):
+    # Pre-bundle artifacts: pickled DataFrame + pickled embeddings
+    import pandas as pd
+
+    metadata_path = os.path.join(model_dir, "movies_metadata.pkl")
+    embeddings_path = os.path.join(model_dir, "embeddings.pkl")
+    movies_df = pd.read_pickle(metadata_path)
+    with open(embeddings_path, "rb") as f:
+        embeddings = pickle.load(f)
+    if len(embeddings) != len(movies_df):
+        raise ValueError(f"{len(embeddings)} embeddings for {len(movies_df)} metadata rows")
+
+    stats = [os.stat(p) for p in (metadata_path, embeddings_path)]
+    version = hashlib.sha256(
+        "".join(f"{s.st_size}:{s.st_mtime_ns};" for s in stats).encode()
+    ).hexdigest()[:16]
+    return ArtifactBundle(embeddings, Catalog.from_dataframe(movies_df), f"legacy-{version}")
+
+
+def load_artifact_bundle(model_dir, verify=True):
+    # Prefer the memory-mapped bundle, fall back to the legacy pickles. Not
+    # when bundle directories exist without a published one (a first publish
+    # or a layout migration in progress): model.py no longer rewrites the
+    # pickles, so they would pair stale embeddings with the new model
+    link = os.path.join(model_dir, BUNDLE_DIRNAME)
+    for _ in range(BUNDLE_LOAD_ATTEMPTS):
+        try:
+            bundle = load_bundle(model_dir, verify=verify)
+        except FileNotFoundError:
+            bundle = None
+        if bundle is not None:
+            return bundle
+        if not os.path.lexists(link):
+            break
+        # The link is there, so a publish replaced and removed the bundle mid-load
+    else:
+        raise ValueError(f"Could not read the bundle at {link}; files are missing or it kept being replaced")
+    pending = sorted(
+        name for name in os.listdir(model_dir) if name.startswith((f"{BUNDLE_DIRNAME}-", f"{BUNDLE_DIRNAME}."))
+    ) if os.path.isdir(model_dir) else []
+    if pending:
+        raise ValueError(f"No published bundle but found {', '.join(pending)}; not falling back to the legacy pickles")
+    return load_legacy_artifacts(model_dir)
+
+
+def load_embeddings(model_dir):
+    return load_artifact_bundle(model_dir, verify=False).embeddings
+
+
+if __name__ == "__main__":
+    # Convert legacy pickled artifacts into a bundle without retraining
+    legacy = load_legacy_artifacts(MODEL_DIR)
+    manifest = write_bundle(MODEL_DIR, legacy.embeddings, legacy.catalog)
+    print(f"Wrote bundle {manifest['version']} with {manifest['rows']} rows")
@@ -0,0 +1,435 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import warnings
+from urllib.parse import quote
+
+import numpy as np
+import torch
+
+from ann_index import IVFIndex, recall_report
+from quantization import RERANK_FACTOR, compression_report
+from similarity import SimilarityIndex, normalize_rows
+from state import load_state
+
+# Configuration
+MODEL_DIR = "backend/artifacts"
+BENCHMARK_DIR = "backend/benchmarks" # Default location of result files
+MICRO_REPEATS = 200
+LOAD_REQUESTS = 200 # Requests per endpoint and concurrency level
+CONCURRENCY = (1, 8, 32)
+SCALE_ROWS = (34_097, 250_000, 1_000_000)
+SCALE_QUERIES = 100
+SCALE_NOISE = 0.05 # Gaussian noise added to resampled embeddings
+SEED = 0
+
+
+def summarize(samples_ms):
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(len(samples)),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def time_calls(fn, repeats=MICRO_REPEATS, warmup=5):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def _sample_queries(state, rng, n):
+    # Realistic inputs drawn from the catalog itself
+    ids = rng.choice(len(state.catalog), n, replace=False)
+    records = state.catalog.records(ids)
+    titles = [r["title"] for r in records if r["title"]]
+    overviews = [r["overview"] for r in records if r["overview"]] or ["a hero fights to save the world"]
+    return ids, records, titles, overviews
+
+
+def micro_benchmarks(state, repeats=MICRO_REPEATS, seed=SEED):
+    """Per-call latency of each stage a request goes through."""
+    from serialization import dumps
+
+    rng = np.random.default_rng(seed)
+    ids, records, titles, overviews = _sample_queries(state, rng, 64)
+    index = state.similarity_index
+    exact = SimilarityIndex(index.vectors, normalized=True)
+
+    def featurize(n):
+        return state.featurizer.transform(
+            [overviews[i % len(overviews)] for i in range(n)],
+            [r["genre"] or [] for r in records[:n]],
+            [r["year"] or 2000 for r in records[:n]],
+        )
+
+    features_1, features_32 = featurize(1), featurize(32)
+    queries_32 = index.vectors[ids[:32]]
+    mask = state.filters.mask(year_min=2020)
+    typo = titles[0][:-1] + "x" if len(titles[0]) > 3 else titles[0]
+    page = ids[:100].tolist()
+
+    cases = {
+        "featurize_1": lambda: featurize(1),
+        "featurize_32": lambda: featurize(32),
+        "encoder_1": lambda: state.encoder.embed(features_1),
+        "encoder_32": lambda: state.encoder.embed(features_32),
+        "topk_exact_1": lambda: exact.search(queries_32[0], 10),
+        "topk_exact_32": lambda: exact.search_batch(queries_32, 10),
+        "topk_exact_filtered_1": lambda: exact.search(queries_32[0], 10, mask=mask),
+        "topk_index_1": lambda: index.search(queries_32[0], 10),
+        "topk_by_id": lambda: index.search_by_id(int(ids[0]), 10),
+        "title_exact": lambda: state.title_index.best_match(titles[0]),
+        "title_fuzzy": lambda: state.title_index.best_match(typo),
+        "title_search": lambda: state.title_index.search(titles[1].split()[0]),
+        "lexical_bm25_top40": lambda: state.lexical.search(*state.lexical.query_terms(titles[2]), 40),
+        "serialize_encoded_100": lambda: state.encoded.movies(page),
+        "serialize_records_100": lambda: dumps(state.catalog.records(page)),
+    }
+    results = {}
+    for name, fn in cases.items():
+        results[name] = time_calls(fn, repeats)
+        print(f"  {name:<24} p50 {results[name]['p50_ms']:8.3f} ms  p99 {results[name]['p99_ms']:8.3f} ms")
+    return results
+
+
+def _endpoint_requests(state, n, seed=SEED):
+    # (method, url, json) per endpoint; parameters vary so results are not
+    # all answered by the same cache entry
+    rng = np.random.default_rng(seed)
+    ids, records, titles, overviews = _sample_queries(state, rng, min(n, len(state.catalog)))
+    ids = ids.tolist()
+
+    def pick(values, i):
+        return values[i % len(values)]
+
+    return {
+        "movies_page": [("GET", f"/movies?page={1 + i % 500}&limit=20", None) for i in range(n)],
+        "movies_search": [("GET", f"/movies?search={quote(pick(titles, i).split()[0])}&limit=20", None) for i in range(n)],
+        "recommend": [("GET", f"/recommend/{pick(ids, i)}?k=10", None) for i in range(n)],
+        "recommend_filtered": [("GET", f"/recommend/{pick(ids, i)}?k=10&year_min=2015", None) for i in range(n)],
+        "recommend_by_title": [("GET", f"/recommend_by_title?title={quote(pick(titles, i))}&k=10", None) for i in range(n)],
+        "recommend_by_plot": [
+            ("POST", "/recommend_by_plot", {"overview": f"{pick(overviews, i)} {i}", "genres": ["Action"], "k": 10})
+            for i in range(n)
+        ],
+        "recommend_batch": [
+            ("POST", "/recommend/batch", {"seeds": [{"movie_id": pick(ids, i + j)} for j in range(5)], "k": 10})
+            for i in range(n)
+        ],
+    }
+
+
+async def _run_load(app, requests, concurrency, base_url=None):
+    # In-process over ASGI when given the app, else over HTTP to base_url
+    import httpx
+
+    latencies = []
+    errors = 0
+    queue = list(reversed(requests))
+
+    if base_url is None:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark")
+    else:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        client = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60)
+    async with client:
+        async def worker():
+            nonlocal errors
+            while queue:
+                method, url, body = queue.pop()
+                start = time.perf_counter()
+                response = await client.request(method, url, json=body)
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {**summarize(latencies), "rps": len(latencies) / elapsed, "errors": errors}
+
+
+async def load_benchmarks(n_requests=LOAD_REQUESTS, concurrency=CONCURRENCY, endpoints=None, use_cache=False):
+    """Drive each endpoint in-process over ASGI at each concurrency level."""
+    import main
+
+    if not use_cache:
+        # Entries expire immediately, so every request does the real work
+        main.result_cache.ttl_seconds = 0
+    # Request logging would dominate the measurement
+    main.request_log.sample_rate = 0
+    main.request_log.slow_seconds = float("inf")
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()) as startup_log:
+        lifespan = main.app.router.lifespan_context(main.app)
+        await lifespan.__aenter__()
+    try:
+        state = main.state_manager.current
+        if state is None:
+            raise RuntimeError(f"App failed to load artifacts:\n{startup_log.getvalue()}")
+        all_requests = _endpoint_requests(state, n_requests)
+        for name, requests in all_requests.items():
+            if endpoints and name not in endpoints:
+                continue
+            results[name] = {}
+            for level in concurrency:
+                stats = await _run_load(main.app, requests, level)
+                results[name][str(level)] = stats
+                print(
+                    f"  {name:<20} c={level:<3} {stats['rps']:8.0f} rps  p50 {stats['p50_ms']:7.2f} ms  "
+                    f"p95 {stats['p95_ms']:7.2f} ms  p99 {stats['p99_ms']:7.2f} ms  errors {stats['errors']}"
+                )
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            await lifespan.__aexit__(None, None, None)
+    return results
+
+
+def _pss_mb(pids):
+    # Proportional set size: shared pages are split between the processes
+    # mapping them, so the sum is the real memory of the whole server
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+    return total / 1024
+
+
+def _wait_until_up(base_url, timeout=120):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/recommend/0?k=1", timeout=2).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not come up within {timeout}s")
+
+
+def worker_benchmarks(state, worker_counts, n_requests=LOAD_REQUESTS, concurrency=32, endpoints=None, port=8765):
+    """Throughput of serve.py over real HTTP as the worker count grows."""
+    all_requests = _endpoint_requests(state, n_requests)
+    serve = os.path.join(os.path.dirname(os.path.abspath(__file__)), "serve.py")
+    env = {**os.environ, "LOG_SAMPLE_RATE": "0", "PYTHONWARNINGS": "ignore"}
+    results = {}
+    for workers in worker_counts:
+        process = subprocess.Popen(
+            [sys.executable, serve, "--workers", str(workers), "--port", str(port), "--host", "127.0.0.1"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            _wait_until_up(base_url)
+            time.sleep(1) # Let every worker finish starting
+            row = {}
+            for name, requests in all_requests.items():
+                if endpoints and name not in endpoints:
+                    continue
+                row[name] = asyncio.run(_run_load(None, requests, concurrency, base_url=base_url))
+                print(
+                    f"  workers={workers:<3} {name:<20} {row[name]['rps']:8.0f} rps  "
+                    f"p50 {row[name]['p50_ms']:7.2f} ms  p99 {row[name]['p99_ms']:7.2f} ms  errors {row[name]['errors']}"
+                )
+            children = subprocess.run(
+                ["pgrep", "-P", str(process.pid)], capture_output=True, text=True
+            ).stdout.split()
+            row["server_pss_mb"] = _pss_mb([process.pid, *map(int, children)])
+            if row["server_pss_mb"] is not None:
+                print(f"  workers={workers:<3} server memory (PSS) {row['server_pss_mb']:.0f} MB")
+            results[str(workers)] = row
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    return results
+
+
+def synthetic_embeddings(base, n_rows, seed=SEED, chunk_size=262_144):
+    # Resample real embeddings with noise, so the synthetic catalog keeps
+    # the real one's cluster structure at any size
+    rng = np.random.default_rng(seed)
+    out = np.empty((n_rows, base.shape[1]), dtype=np.float32)
+    for start in range(0, n_rows, chunk_size):
+        rows = min(chunk_size, n_rows - start)
+        chunk = base[rng.integers(0, len(base), rows)]
+        chunk = chunk + rng.normal(0, SCALE_NOISE, chunk.shape).astype(np.float32)
+        out[start:start + rows] = normalize_rows(chunk)
+    return out
+
+
+def scale_benchmarks(state, sizes=SCALE_ROWS, n_queries=SCALE_QUERIES, ivf=True, codecs=(), seed=SEED):
+    """Similarity search cost as the catalog grows (synthetic rows)."""
+    base = np.asarray(state.similarity_index.vectors)
+    rng = np.random.default_rng(seed)
+    results = {}
+    for n_rows in sizes:
+        start = time.perf_counter()
+        vectors = synthetic_embeddings(base, n_rows, seed)
+        row = {"rows": n_rows, "generate_seconds": time.perf_counter() - start, "embedding_mb": vectors.nbytes / 2**20}
+        index = SimilarityIndex(vectors, normalized=True)
+        queries = vectors[rng.choice(n_rows, n_queries, replace=False)]
+        batch = queries[:32]
+        mask = rng.random(n_rows) < 0.1
+
+        row["exact_1"] = time_calls(lambda: index.search(queries[0], 10), repeats=n_queries)
+        row["exact_32"] = time_calls(lambda: index.search_batch(batch, 10), repeats=max(10, n_queries // 10))
+        row["exact_filtered_10pct"] = time_calls(lambda: index.search(queries[0], 10, mask=mask), repeats=n_queries)
+        if ivf:
+            start = time.perf_counter()
+            ann = IVFIndex.build(vectors)
+            row["ivf_build_seconds"] = time.perf_counter() - start
+            report = recall_report(vectors, ann, k=10, n_queries=n_queries, nprobes=(ann.nprobe,))[0]
+            row["ivf"] = {"nlist": ann.nlist, **report}
+            del ann
+        if codecs:
+            row["quantized"] = compression_report(
+                vectors, kinds=codecs, k=10, n_queries=n_queries, rerank_factors=(RERANK_FACTOR,)
+            )
+            for report in row["quantized"]:
+                print(
+                    f"  {n_rows:>9} rows  {report['codec']:<8} {report['bytes'] / 2**20:7.1f} MB "
+                    f"({report['compression']:.1f}x)  {report['latency_ms']:6.2f} ms  recall {report['recall']:.3f}"
+                )
+        row["peak_rss_mb"] = peak_rss_mb()
+        results[str(n_rows)] = row
+        print(
+            f"  {n_rows:>9} rows  exact p50 {row['exact_1']['p50_ms']:7.2f} ms  "
+            f"batch32 p50 {row['exact_32']['p50_ms']:8.2f} ms  filtered p50 {row['exact_filtered_10pct']['p50_ms']:7.2f} ms"
+            + (f"  ivf {row['ivf']['latency_ms']:6.2f} ms recall {row['ivf']['recall']:.3f}" if ivf else "")
+            + f"  rss {row['peak_rss_mb']:.0f} MB"
+        )
+        del vectors, index
+    return results
+
+
+def run_metadata(state):
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": commit,
+        "artifact_version": state.version,
+        "catalog_rows": len(state.catalog),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "numpy": np.__version__,
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def compare(previous, current, path=()):
+    # Relative change of every p50/rps figure present in both runs
+    if isinstance(current, dict):
+        for key, value in current.items():
+            if isinstance(previous, dict) and key in previous:
+                compare(previous[key], value, path + (key,))
+        return
+    if path and path[-1] in ("p50_ms", "rps") and isinstance(current, (int, float)) and previous:
+        change = (current - previous) / previous * 100
+        print(f"  {'/'.join(path):<60} {previous:10.3f} -> {current:10.3f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency/throughput benchmarks for the model and API")
+    parser.add_argument("suites", nargs="*", choices=["micro", "load", "scale", "workers"], default=["micro", "load"])
+    parser.add_argument("--repeats", type=int, default=MICRO_REPEATS)
+    parser.add_argument("--requests", type=int, default=LOAD_REQUESTS)
+    parser.add_argument("--concurrency", default=",".join(map(str, CONCURRENCY)))
+    parser.add_argument("--endpoints", default="", help="Comma-separated subset of load endpoints")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the result cache on during load tests")
+    parser.add_argument("--workers", default="1,2,4", help="Worker counts for the workers suite (serve.py)")
+    parser.add_argument("--rows", default=",".join(map(str, SCALE_ROWS)), help="Synthetic catalog sizes")
+    parser.add_argument("--codecs", default="", help="Compressed codecs to evaluate in the scale suite, e.g. int8,pq")
+    parser.add_argument("--no-ivf", action="store_true", help="Skip IVF build/recall in the scale suite")
+    parser.add_argument("--output", default=None, help="Result JSON path (default: a timestamped file)")
+    parser.add_argument("--compare", default=None, help="Previous result JSON to diff against")
+    args = parser.parse_args()
+    # sklearn warns on every featurize call; it would drown the report
+    warnings.filterwarnings("ignore", category=UserWarning, module="sklearn")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        state = load_state(MODEL_DIR, verify=False)
+    results = {"meta": run_metadata(state)}
+
+    if "micro" in args.suites:
+        print("Micro-benchmarks")
+        results["micro"] = micro_benchmarks(state, repeats=args.repeats)
+    if "load" in args.suites:
+        print("ASGI load")
+        results["load"] = asyncio.run(load_benchmarks(
+            n_requests=args.requests,
+            concurrency=[int(c) for c in args.concurrency.split(",")],
+            endpoints=[e for e in args.endpoints.split(",") if e],
+            use_cache=args.with_cache,
+        ))
+    if "workers" in args.suites:
+        print("Multi-worker HTTP scaling")
+        results["workers"] = worker_benchmarks(
+            state,
+            [int(w) for w in args.workers.split(",")],
+            n_requests=args.requests,
+            concurrency=max(int(c) for c in args.concurrency.split(",")),
+            endpoints=[e for e in args.endpoints.split(",") if e],
+        )
+    if "scale" in args.suites:
+        print("Synthetic catalog scaling")
+        results["scale"] = scale_benchmarks(
+            state,
+            sizes=[int(n) for n in args.rows.split(",")],
+            ivf=not args.no_ivf,
+            codecs=[c for c in args.codecs.split(",") if c],
+        )
+    results["meta"]["peak_rss_mb"] = peak_rss_mb()
+    print(f"Peak RSS {results['meta']['peak_rss_mb']:.0f} MB")
+
+    output = args.output
+    if output is None:
+        os.makedirs(BENCHMARK_DIR, exist_ok=True)
+        output = os.path.join(BENCHMARK_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+        print(f"Compared with {args.compare}")
+        compare(previous, results)
+
+
+if __name__ == "__main__":
+    main()
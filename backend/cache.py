@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# Configuration
+BREAKER_FAILURES = 3 # Consecutive failed calls before the remote cache is bypassed
+BREAKER_RESET_SECONDS = 5.0 # How long it is bypassed before the next attempt
+
+
+class LocalCacheBackend:
+    """In-process LRU store with per-entry expiry."""
+
+    blocking = False # Cheap enough to call from the event loop
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_seconds):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RemoteCacheBackend:
+    """Client for a shared CacheServer, so several workers share one cache.
+
+    Values must be JSON-serializable. Any network error is treated as a
+    miss: a broken cache server slows requests down but never fails them.
+    Calls block on the network, so async code goes through ResultCache's
+    `a*` methods. After `BREAKER_FAILURES` failed calls in a row the server
+    is skipped (every call is an immediate miss) for `BREAKER_RESET_SECONDS`.
+    """
+
+    blocking = True
+
+    def __init__(self, host, port, timeout=0.5):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.failures = 0
+        self.open_until = 0.0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _call(self, request):
+        if time.monotonic() < self.open_until:
+            return None
+        with self._lock:
+            if time.monotonic() < self.open_until:
+                # Opened while this call waited for the connection
+                return None
+            for attempt in range(2):
+                try:
+                    if self._file is None:
+                        conn = socket.create_connection(self.address, timeout=self.timeout)
+                        self._file = conn.makefile("rwb")
+                    self._file.write(json.dumps(request).encode() + b"\n")
+                    self._file.flush()
+                    response = json.loads(self._file.readline())
+                    self.failures = 0
+                    return response
+                except (OSError, ValueError):
+                    # Stale or dropped connection: reconnect once, then give up
+                    self._close()
+            self.failures += 1
+            if self.failures >= BREAKER_FAILURES:
+                self.open_until = time.monotonic() + BREAKER_RESET_SECONDS
+                print(f"Cache server {self.address[0]}:{self.address[1]} unreachable, bypassing it for {BREAKER_RESET_SECONDS:.0f}s")
+            return None
+
+    def _close(self):
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = None
+
+    def __len__(self):
+        response = self._call({"op": "size"})
+        return response["size"] if response else 0
+
+    @property
+    def evictions(self):
+        response = self._call({"op": "size"})
+        return response["evictions"] if response else 0
+
+    def get(self, key):
+        response = self._call({"op": "get", "key": key})
+        if not response or not response.get("hit"):
+            return MISSING
+        return response["value"]
+
+    def set(self, key, value, ttl_seconds):
+        self._call({"op": "set", "key": key, "value": value, "ttl": ttl_seconds})
+
+    def clear(self):
+        self._call({"op": "clear"})
+
+
+class ResultCache:
+    """Bounded LRU/TTL cache for endpoint results.
+
+    Keys combine the endpoint, its normalized parameters and the artifact
+    version, so results from an older bundle are never served after a reload.
+    """
+
+    def __init__(self, max_entries=4096, ttl_seconds=300, backend=None):
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend if backend is not None else LocalCacheBackend(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(endpoint, version, **params):
+        return json.dumps([endpoint, version, params], sort_keys=True, separators=(",", ":"))
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is MISSING:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, value
+
+    def set(self, key, value):
+        self.backend.set(key, value, self.ttl_seconds)
+
+    def clear(self):
+        self.backend.clear()
+
+    # Async variants for handlers: a remote backend's round trip runs in a
+    # thread, so a slow cache server never stalls the event loop
+
+    async def aget(self, key):
+        if not self.backend.blocking:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key, value):
+        if not self.backend.blocking:
+            return self.set(key, value)
+        await asyncio.to_thread(self.set, key, value)
+
+    async def astats(self):
+        if not self.backend.blocking:
+            return self.stats()
+        return await asyncio.to_thread(self.stats)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.backend),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.backend.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CacheServer(socketserver.ThreadingTCPServer):
+    """Minimal shared cache: one JSON request/response per line over TCP.
+
+    Good enough as a shared store between local workers and as a stand-in
+    for an external cache in tests.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, max_entries=65536):
+        self.store = LocalCacheBackend(max_entries)
+        super().__init__(address, _CacheRequestHandler)
+
+
+class _CacheRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        store = self.server.store
+        for line in self.rfile:
+            request = json.loads(line)
+            op = request.get("op")
+            if op == "get":
+                value = store.get(request["key"])
+                response = {"hit": False} if value is MISSING else {"hit": True, "value": value}
+            elif op == "set":
+                store.set(request["key"], request["value"], request["ttl"])
+                response = {"ok": True}
+            elif op == "clear":
+                store.clear()
+                response = {"ok": True}
+            elif op == "size":
+                response = {"size": len(store), "evictions": store.evictions}
+            else:
+                response = {"error": f"unknown op {op}"}
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+
+def start_cache_server(host="127.0.0.1", port=0, max_entries=65536):
+    # Serve in a background thread; port=0 picks a free port
+    server = CacheServer((host, port), max_entries=max_entries)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def backend_from_address(address, max_entries):
+    # "host:port" -> shared backend, empty/None -> in-process backend
+    if not address:
+        return LocalCacheBackend(max_entries)
+    host, port = address.rsplit(":", 1)
+    return RemoteCacheBackend(host, int(port))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared result cache server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-entries", type=int, default=65536)
+    args = parser.parse_args()
+    server = CacheServer((args.host, args.port), max_entries=args.max_entries)
+    print(f"Cache server listening on {args.host}:{args.port}")
+    server.serve_forever()
@@ -0,0 +1,170 @@
+import hashlib
+
+import numpy as np
+
+YEAR_MISSING = 0
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def content_hash(record):
+    # Stable 64-bit hash of a movie's content fields (not its id), used to
+    # tell which rows changed between catalog versions
+    fields = [
+        record["title"] or "",
+        str(record["year"] or ""),
+        "|".join(record["genre"] or []),
+        record["industry"] or "",
+        record["overview"] or "",
+    ]
+    digest = hashlib.blake2b("\x1f".join(fields).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class StringColumn:
+    """Variable-length UTF-8 strings stored as one byte blob plus offsets.
+
+    Row i is blob[offsets[i]:offsets[i + 1]]. Both arrays can be memory-mapped,
+    so the column costs no per-row Python objects until a row is read.
+    """
+
+    def __init__(self, blob, offsets, nulls=None):
+        self.blob = blob
+        self.offsets = offsets
+        self.nulls = nulls
+
+    @classmethod
+    def from_values(cls, values):
+        encoded = []
+        nulls = np.zeros(len(values), dtype=bool)
+        for i, value in enumerate(values):
+            if _is_missing(value):
+                nulls[i] = True
+                encoded.append(b"")
+            else:
+                encoded.append(str(value).encode("utf-8"))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(blob, offsets, nulls if nulls.any() else None)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self.nulls is not None and self.nulls[i]:
+            return None
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def take(self, indices):
+        return [self[i] for i in indices]
+
+    def tolist(self):
+        return self.take(range(len(self)))
+
+    def arrays(self, name):
+        arrays = {f"{name}_blob": self.blob, f"{name}_offsets": self.offsets}
+        if self.nulls is not None:
+            arrays[f"{name}_nulls"] = self.nulls
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, name):
+        return cls(arrays[f"{name}_blob"], arrays[f"{name}_offsets"], arrays.get(f"{name}_nulls"))
+
+
+class Catalog:
+    """Movie metadata held as flat column arrays instead of a DataFrame.
+
+    Missing values are resolved once when the catalog is built, so reading a
+    record never has to check for NaN.
+    """
+
+    GENRE_SEPARATOR = "|"
+
+    def __init__(self, title, year, genre, industry_codes, industries, overview):
+        self.title = title
+        self.year = year
+        self.genre = genre
+        self.industry_codes = industry_codes
+        self.industries = list(industries)
+        self.overview = overview
+
+    @classmethod
+    def from_dataframe(cls, df):
+        genres = []
+        for value in df["genre"].tolist():
+            if isinstance(value, str):
+                value = value.split(", ")
+            genres.append(None if _is_missing(value) else cls.GENRE_SEPARATOR.join(value))
+
+        years = np.asarray(
+            [YEAR_MISSING if _is_missing(y) else int(float(y)) for y in df["year"].tolist()],
+            dtype=np.int16,
+        )
+
+        industry_values = df["industry"].tolist()
+        industries = sorted({i for i in industry_values if not _is_missing(i)})
+        lookup = {name: code for code, name in enumerate(industries)}
+        industry_codes = np.asarray(
+            [-1 if _is_missing(i) else lookup[i] for i in industry_values], dtype=np.int16
+        )
+
+        overviews = ["" if _is_missing(o) else o for o in df["overview"].tolist()]
+        return cls(
+            StringColumn.from_values(df["title"].tolist()),
+            years,
+            StringColumn.from_values(genres),
+            industry_codes,
+            industries,
+            StringColumn.from_values(overviews),
+        )
+
+    def arrays(self):
+        return {
+            **self.title.arrays("title"),
+            "year": self.year,
+            **self.genre.arrays("genre"),
+            "industry_codes": self.industry_codes,
+            **self.overview.arrays("overview"),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, industries):
+        return cls(
+            StringColumn.from_arrays(arrays, "title"),
+            arrays["year"],
+            StringColumn.from_arrays(arrays, "genre"),
+            arrays["industry_codes"],
+            industries,
+            StringColumn.from_arrays(arrays, "overview"),
+        )
+
+    def __len__(self):
+        return len(self.year)
+
+    def titles(self, indices):
+        return self.title.take(indices)
+
+    def record(self, i):
+        i = int(i)
+        year = int(self.year[i])
+        genre = self.genre[i]
+        code = int(self.industry_codes[i])
+        return {
+            "index": i,
+            "title": self.title[i],
+            "year": None if year == YEAR_MISSING else year,
+            "genre": None if genre is None else genre.split(self.GENRE_SEPARATOR),
+            "industry": None if code < 0 else self.industries[code],
+            "overview": self.overview[i],
+            "id": i,
+        }
+
+    def records(self, indices):
+        return [self.record(i) for i in indices]
+
+    def content_hashes(self):
+        return np.array([content_hash(self.record(i)) for i in range(len(self))], dtype=np.uint64)
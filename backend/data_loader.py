@@ -1,11 +1,21 @@
 import pandas as pd
-import requests
-import io
+import hashlib
+import json
 import os
+import shutil
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
 DATA_DIR = "backend/data"
 OUTPUT_FILE = os.path.join(DATA_DIR, "movies.csv")
+CACHE_DIR = os.path.join(DATA_DIR, "cache") # Raw source CSVs + ETag/checksum index
+CACHE_INDEX = os.path.join(CACHE_DIR, "index.json")
+MAX_WORKERS = 6 # Concurrent downloads
+TIMEOUT_SECONDS = 30
+CHUNK_SIZE = 10_000 # Rows parsed per chunk
+COLUMNS = ['title', 'year', 'genre', 'overview', 'industry']
 
 # GitHub Raw URLs from Simatwa/movies-dataset
 URLS = {
@@ -57,72 +67,209 @@ AUGMENTED_DATA = [
     {"title": "Avatar 3", "year": 2025, "genre": "Action, Adventure, Fantasy", "overview": "The third installment in the Avatar franchise.", "industry": "Hollywood"}
 ]
 
-def download_and_merge():
-    all_movies = []
-    
-    print("Downloading datasets...")
-    for genre, url in URLS.items():
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_cache_index():
+    if not os.path.exists(CACHE_INDEX):
+        return {}
+    with open(CACHE_INDEX) as f:
+        return json.load(f)
+
+def save_cache_index(index):
+    tmp_path = CACHE_INDEX + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, CACHE_INDEX)
+
+def fetch_source(name, url, entry):
+    """Download one source CSV into the cache, skipping it when unchanged.
+
+    Sends the cached ETag / Last-Modified so the server can answer 304, and
+    resumes an interrupted download with a Range request. A source whose
+    bytes hash to the cached checksum also counts as unchanged.
+    Returns (path, entry, changed) where entry is the new cache index record.
+    """
+    path = os.path.join(CACHE_DIR, f"{name}.csv")
+    part_path = path + ".part"
+    part_meta_path = part_path + ".json"
+    entry = dict(entry or {})
+
+    request = urllib.request.Request(url)
+    if os.path.exists(path) and entry.get("url") == url:
+        if entry.get("etag"):
+            request.add_header("If-None-Match", entry["etag"])
+        if entry.get("last_modified"):
+            request.add_header("If-Modified-Since", entry["last_modified"])
+
+    # Resume a partial download, but only if the server still has the same file
+    offset = 0
+    if os.path.exists(part_path) and os.path.exists(part_meta_path):
+        with open(part_meta_path) as f:
+            part_meta = json.load(f)
+        if part_meta.get("url") == url and part_meta.get("etag"):
+            offset = os.path.getsize(part_path)
+            request.add_header("Range", f"bytes={offset}-")
+            request.add_header("If-Range", part_meta["etag"])
+
+    try:
+        response = urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return path, entry, False
+        raise
+
+    with response:
+        if response.status != 206:
+            offset = 0 # Full body: start the part file over
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        with open(part_meta_path, "w") as f:
+            json.dump({"url": url, "etag": etag}, f)
+        with open(part_path, "ab" if offset else "wb") as f:
+            shutil.copyfileobj(response, f, 1 << 20)
+        # A dropped connection just ends the body early; keep the part file
+        # for the next run to resume instead of caching a truncated copy
+        expected = response.headers.get("Content-Length")
+        received = os.path.getsize(part_path) - offset
+        if expected is not None and received < int(expected):
+            raise urllib.error.ContentTooShortError(f"got {received} of {expected} bytes", None)
+
+    checksum = _sha256(part_path)
+    changed = checksum != entry.get("sha256") or not os.path.exists(path)
+    os.replace(part_path, path)
+    os.remove(part_meta_path)
+    entry.update({"url": url, "etag": etag, "last_modified": last_modified, "sha256": checksum})
+    return path, entry, changed
+
+def fetch_all(urls, sources):
+    # Download every source concurrently; a failed source falls back to its
+    # cached copy when there is one
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {genre: pool.submit(fetch_source, genre, url, sources.get(genre)) for genre, url in urls.items()}
+
+    paths = {}
+    for genre, future in futures.items():
         try:
-            print(f"Fetching {genre}...")
-            # These CSVs usually have columns like: index, movie_name, year, rating, runtime, genre, sid, description
-            df = pd.read_csv(url)
-            
-            # Standardize columns
-            # The Simatwa dataset columns might vary, let's inspect or assume common ones based on repo
-            # Usually: movie_name, year, genre, description
-            
-            # Let's rename to standard keys
-            # Note: We might need to adjust this after seeing the actual CSV structure if it fails.
-            # But based on typical structure:
-            if 'movie_name' in df.columns:
-                df = df.rename(columns={'movie_name': 'title', 'description': 'overview'})
-            
-            # Add industry tag (Default to Hollywood for these English datasets, though they might contain others)
-            df['industry'] = 'Hollywood' 
-            
-            # Select only relevant columns
-            cols = ['title', 'year', 'genre', 'overview', 'industry']
-            # Filter for existing cols only
-            existing_cols = [c for c in cols if c in df.columns]
-            df = df[existing_cols]
-            
-            all_movies.append(df)
-            
+            path, sources[genre], changed = future.result()
+            print(f"Fetched {genre}" if changed else f"{genre} unchanged, using cache")
+            paths[genre] = path
         except Exception as e:
-            print(f"Error downloading {genre}: {e}")
+            cached = os.path.join(CACHE_DIR, f"{genre}.csv")
+            if genre in sources and os.path.exists(cached):
+                print(f"Error downloading {genre}: {e} (using cached copy)")
+                paths[genre] = cached
+            else:
+                print(f"Error downloading {genre}: {e}")
+    return paths
+
+def compact_frame(df):
+    # Standard columns with compact dtypes: int16 year, categorical genre/industry
+    df = df.reindex(columns=COLUMNS)
+    df['overview'] = df['overview'].fillna('')
+    df['genre'] = df['genre'].fillna('Unknown').astype('category')
+    df['industry'] = df['industry'].astype('category')
+    years = df['year'].astype(str).str.extract(r'(\d{4})', expand=False)
+    df['year'] = pd.to_numeric(years, errors='coerce').fillna(2000).astype('int16')
+    return df
 
-    if not all_movies:
+def parse_source(path, chunk_size=CHUNK_SIZE):
+    # Stream one source CSV as compact chunks of the standard columns
+    # These CSVs usually have columns like: index, movie_name, year, rating, runtime, genre, sid, description
+    header = pd.read_csv(path, nrows=0).columns
+    renames = {'movie_name': 'title', 'description': 'overview'} if 'movie_name' in header else {}
+    usecols = [c for c in header if renames.get(c, c) in COLUMNS]
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=str, chunksize=chunk_size):
+        chunk = chunk.rename(columns=renames)
+        # Industry tag (Default to Hollywood for these English datasets, though they might contain others)
+        chunk['industry'] = 'Hollywood'
+        yield compact_frame(chunk)
+
+def _titles(chunk):
+    # Missing titles count as one title, like pandas' drop_duplicates
+    return [None if pd.isna(title) else title for title in chunk['title'].tolist()]
+
+def drop_duplicate_titles(make_chunks):
+    """Streaming drop_duplicates(subset=['title'], keep='last') in two passes.
+
+    `make_chunks()` must yield the same chunks each time it is called (the
+    sources are cached on disk). The first pass only records the position of
+    each title's last row; the second yields every chunk as soon as it is
+    read, filtered to those rows, so at most one chunk is held in memory.
+    """
+    last = {} # title -> position of its last row across all chunks
+    position = 0
+    for chunk in make_chunks():
+        for title in _titles(chunk):
+            last[title] = position
+            position += 1
+
+    position = 0
+    for chunk in make_chunks():
+        positions = range(position, position + len(chunk))
+        keep = [last[title] == p for title, p in zip(_titles(chunk), positions)]
+        position += len(chunk)
+        yield chunk[keep]
+
+def _inputs_signature(sources, paths):
+    # Identifies the merged output: source checksums + augmentation data
+    digest = hashlib.sha256()
+    for genre in sorted(paths):
+        digest.update(f"{genre}:{sources[genre]['sha256']};".encode())
+    digest.update(json.dumps(AUGMENTED_DATA, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+def download_and_merge(urls=URLS, output_file=OUTPUT_FILE, force=False):
+    print("Downloading datasets...")
+    index = load_cache_index()
+    sources = index.setdefault("sources", {})
+    outputs = index.setdefault("outputs", {})
+    paths = fetch_all(urls, sources)
+    save_cache_index(index)
+
+    # Nothing changed since the last merge: keep the existing output
+    signature = _inputs_signature(sources, paths)
+    if not force and os.path.exists(output_file) and outputs.get(output_file) == signature:
+        print(f"Sources unchanged, {output_file} is up to date")
+        return
+
+    if not paths:
         print("Failed to download any data. Creating empty base.")
-        base_df = pd.DataFrame(columns=['title', 'year', 'genre', 'overview', 'industry'])
-    else:
-        base_df = pd.concat(all_movies, ignore_index=True)
 
-    print(f"Downloaded {len(base_df)} movies.")
+    # Parse each source in chunks, then augment with South Indian & Recent
+    def chunks():
+        for genre in urls:
+            if genre in paths:
+                yield from parse_source(paths[genre])
+        yield compact_frame(pd.DataFrame(AUGMENTED_DATA, columns=COLUMNS))
 
-    # Augment with South Indian & Recent
-    print("Augmenting data...")
-    aug_df = pd.DataFrame(AUGMENTED_DATA)
-    
-    # Combine
-    final_df = pd.concat([base_df, aug_df], ignore_index=True)
-    
-    # Cleaning
-    print("Cleaning data...")
-    # Drop duplicates by title
-    final_df = final_df.drop_duplicates(subset=['title'], keep='last')
-    # Fill NA
-    final_df['overview'] = final_df['overview'].fillna('')
-    final_df['genre'] = final_df['genre'].fillna('Unknown')
-    final_df['year'] = final_df['year'].astype(str).str.extract(r'(\d{4})').fillna('2000')
-    
-    # Save
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-        
-    final_df.to_csv(OUTPUT_FILE, index=False)
-    print(f"Saved {len(final_df)} movies to {OUTPUT_FILE}")
-    print("Sample:")
-    print(final_df.tail())
+    # Cleaning: drop duplicates by title as chunks stream through, then
+    # append each chunk to the output instead of concatenating one frame
+    print("Augmenting and cleaning data...")
+    if not os.path.exists(os.path.dirname(output_file)):
+        os.makedirs(os.path.dirname(output_file))
+
+    total = 0
+    tmp_file = output_file + ".tmp"
+    last_chunk = None
+    for i, chunk in enumerate(drop_duplicate_titles(chunks)):
+        chunk.to_csv(tmp_file, index=False, mode="w" if i == 0 else "a", header=i == 0)
+        total += len(chunk)
+        if len(chunk):
+            last_chunk = chunk
+    os.replace(tmp_file, output_file)
+
+    outputs[output_file] = signature
+    save_cache_index(index)
+    print(f"Saved {total} movies to {output_file}")
+    if last_chunk is not None:
+        print("Sample:")
+        print(last_chunk.tail())
 
 if __name__ == "__main__":
     download_and_merge()
@@ -0,0 +1,46 @@
+import os
+import pickle
+
+import numpy as np
+from scipy import sparse
+
+
+def combine_features(genre_matrix, overview_matrix, year_matrix):
+    # [Genre_Multi_Hot, Overview_TFIDF, Year_Norm] as one float32 CSR matrix
+    return sparse.hstack(
+        [sparse.csr_matrix(genre_matrix), sparse.csr_matrix(overview_matrix), sparse.csr_matrix(year_matrix)],
+        format="csr",
+        dtype=np.float32,
+    )
+
+
+class Featurizer:
+    """The training-time feature pipeline for query rows, kept sparse.
+
+    Produces [genre multi-hot | overview TF-IDF | normalized year] as a
+    float32 CSR matrix, matching the column order used by model.py.
+    """
+
+    def __init__(self, tfidf, mlb, scaler):
+        self.tfidf = tfidf
+        self.mlb = mlb
+        self.scaler = scaler
+
+    @classmethod
+    def load(cls, model_dir):
+        preprocessors = []
+        for name in ("tfidf", "mlb", "scaler"):
+            with open(os.path.join(model_dir, f"{name}.pkl"), "rb") as f:
+                preprocessors.append(pickle.load(f))
+        return cls(*preprocessors)
+
+    @property
+    def input_dim(self):
+        return len(self.mlb.classes_) + len(self.tfidf.vocabulary_) + 1
+
+    def transform(self, overviews, genres, years):
+        return combine_features(
+            self.mlb.transform(genres),
+            self.tfidf.transform(overviews),
+            self.scaler.transform([[y] for y in years]),
+        )
@@ -0,0 +1,101 @@
+from functools import lru_cache
+
+import numpy as np
+
+from catalog import YEAR_MISSING
+
+# Configuration
+YEAR_BUCKET_SIZE = 10 # Years per precomputed bucket mask (decades)
+MASK_CACHE_SIZE = 256 # Combined masks kept for repeated filter combinations
+
+
+class FilterIndex:
+    """Precomputed boolean row masks for industry, genre and year filters.
+
+    One mask per industry, per genre in the catalog and per year bucket. A filter combines them with
+    bitwise ops: industries and genres OR within their group, groups AND
+    together. The combined mask is applied inside the top-k scan, so a
+    filtered search still returns k results without over-fetching.
+    """
+
+    def __init__(self, catalog):
+        n = len(catalog)
+        self.size = n
+
+        self.industry_masks = {
+            name: np.asarray(catalog.industry_codes) == code for code, name in enumerate(catalog.industries)
+        }
+
+        postings = {}
+        for row, genres in enumerate(catalog.genre.tolist()):
+            if genres is None:
+                continue
+            for genre in genres.split(catalog.GENRE_SEPARATOR):
+                postings.setdefault(genre.casefold(), []).append(row)
+        self.genre_masks = {}
+        for genre, rows in postings.items():
+            mask = np.zeros(n, dtype=bool)
+            mask[rows] = True
+            self.genre_masks[genre] = mask
+
+        self.years = np.asarray(catalog.year)
+        buckets = self.years // YEAR_BUCKET_SIZE
+        self.year_masks = {
+            int(bucket): buckets == bucket for bucket in np.unique(buckets[self.years != YEAR_MISSING])
+        }
+
+        self._mask = lru_cache(maxsize=MASK_CACHE_SIZE)(self._build_mask)
+
+    def industry_mask(self, query):
+        # Case-insensitive substring match against the (few) industry names
+        query = query.casefold()
+        mask = np.zeros(self.size, dtype=bool)
+        for name, industry_mask in self.industry_masks.items():
+            if query in name.casefold():
+                mask |= industry_mask
+        return mask
+
+    def genre_mask(self, genres):
+        # Rows with any of the genres; unknown genres match nothing
+        mask = np.zeros(self.size, dtype=bool)
+        for genre in genres:
+            genre_mask = self.genre_masks.get(genre.casefold())
+            if genre_mask is not None:
+                mask |= genre_mask
+        return mask
+
+    def year_mask(self, year_min=None, year_max=None):
+        # Whole buckets inside the range are OR-ed as is; only the (at most
+        # two) buckets straddling a bound are refined row by row
+        low = -np.inf if year_min is None else year_min
+        high = np.inf if year_max is None else year_max
+        mask = np.zeros(self.size, dtype=bool)
+        for bucket, bucket_mask in self.year_masks.items():
+            first = bucket * YEAR_BUCKET_SIZE
+            last = first + YEAR_BUCKET_SIZE - 1
+            if first >= low and last <= high:
+                mask |= bucket_mask
+            elif last >= low and first <= high:
+                mask |= bucket_mask & (self.years >= low) & (self.years <= high)
+        return mask
+
+    def mask(self, industry=None, genres=None, year_min=None, year_max=None):
+        """Combined mask for the given filters, or None when there are none.
+
+        The returned array is shared between callers and must not be modified.
+        """
+        genres = tuple(sorted(g.casefold() for g in genres)) if genres else None
+        if industry is None and genres is None and year_min is None and year_max is None:
+            return None
+        return self._mask(industry, genres, year_min, year_max)
+
+    def _build_mask(self, industry, genres, year_min, year_max):
+        mask = np.ones(self.size, dtype=bool)
+        if industry is not None:
+            mask &= self.industry_mask(industry)
+        if genres is not None:
+            mask &= self.genre_mask(genres)
+        if year_min is not None or year_max is not None:
+            mask &= self.year_mask(year_min, year_max)
+        mask.flags.writeable = False
+        return mask
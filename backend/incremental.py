@@ -0,0 +1,264 @@
+import argparse
+import os
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import torch
+
+from ann_index import IVF_FILENAME, IVFIndex, load_ivf_index, rebuild_ivf_index
+from quantization import QUANTIZED_FILENAME, QuantizedIndex, load_quantized_index, rebuild_quantized_index
+from artifacts import load_artifact_bundle, publish_bundle, stage_bundle
+from catalog import Catalog, content_hash
+from features import Featurizer
+from inference import EncoderInference
+from model import prepare_frame
+from neighbours import (
+    NEIGHBOURS_FILENAME,
+    build_neighbour_table,
+    load_neighbour_table,
+    save_neighbour_table,
+    update_neighbour_table,
+)
+from similarity import normalize_rows
+
+# Configuration
+DATA_PATH = "backend/data/movies.csv"
+MODEL_DIR = "backend/artifacts"
+OOV_DRIFT_THRESHOLD = 0.15 # Extra share of out-of-vocabulary tokens vs. the trained catalog
+APPEND_RETRAIN_FRACTION = 0.10 # Catalog growth since training that warrants a retrain
+DRIFT_SAMPLE_SIZE = 2000 # Catalog rows sampled for the baseline OOV rate
+DRIFT_MIN_TOKENS = 50 # New overview tokens needed before their OOV rate counts as drift
+
+
+def plan_update(catalog, existing_hashes, candidates):
+    """Split candidate rows into appended and changed ones.
+
+    A candidate whose content hash is already in the catalog is unchanged.
+    Otherwise it replaces the catalog row with the same title, or is
+    appended when the title is new. Returns (appended, changed) where
+    appended lists candidate rows and changed maps catalog id -> candidate row.
+    """
+    known = set(existing_hashes.tolist())
+    title_ids = {}
+    for i, title in enumerate(catalog.title.tolist()):
+        title_ids.setdefault(title, i)
+
+    appended = []
+    changed = {}
+    for row in range(len(candidates)):
+        record = candidates.record(row)
+        if content_hash(record) in known:
+            continue
+        movie_id = title_ids.get(record["title"])
+        if movie_id is None or movie_id in changed:
+            appended.append(row)
+        else:
+            changed[movie_id] = row
+    return appended, changed
+
+
+def _oov_rate(analyzer, vocabulary, overviews):
+    tokens = [token for overview in overviews for token in analyzer(overview)]
+    if not tokens:
+        return 0.0
+    return sum(token not in vocabulary for token in tokens) / len(tokens)
+
+
+def _held_out_oov_rate(analyzer, vocabulary, overviews, sample):
+    # The vocabulary was fit on these overviews, so their plain OOV rate is
+    # ~0 by construction. Estimate the rate for unseen in-distribution text
+    # instead: a sampled token counts as unseen when it is outside the
+    # vocabulary or no other overview uses it (leave-one-out)
+    documents = [analyzer(overview) for overview in overviews]
+    document_frequency = Counter(token for tokens in documents for token in set(tokens))
+    tokens = [token for i in sample for token in documents[i]]
+    if not tokens:
+        return 0.0
+    unseen = sum(token not in vocabulary or document_frequency[token] == 1 for token in tokens)
+    return unseen / len(tokens)
+
+
+def drift_report(featurizer, catalog, records, seed=0):
+    """How far the updated rows are from what the preprocessors were fit on.
+
+    The encoder and TF-IDF vocabulary stay frozen in append mode, so words,
+    genres and years unseen at training time are silently dropped or
+    extrapolated. Any reason listed means a full retrain is warranted.
+    """
+    analyzer = featurizer.tfidf.build_analyzer()
+    vocabulary = featurizer.tfidf.vocabulary_
+    # Baseline from rows that have an overview (most rows have none)
+    overviews = [overview for overview in catalog.overview.tolist() if overview]
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(overviews), min(DRIFT_SAMPLE_SIZE, len(overviews)), replace=False)
+    baseline_oov = _held_out_oov_rate(analyzer, vocabulary, overviews, sample) if overviews else None
+    new_tokens = sum(len(analyzer(r["overview"] or "")) for r in records)
+    new_oov = _oov_rate(analyzer, vocabulary, [r["overview"] or "" for r in records])
+
+    known_genres = set(featurizer.mlb.classes_)
+    unknown_genres = sorted({g for r in records for g in (r["genre"] or []) if g not in known_genres})
+    year_min, year_max = featurizer.scaler.data_min_[0], featurizer.scaler.data_max_[0]
+    years_out_of_range = sum(
+        r["year"] is not None and not year_min <= r["year"] <= year_max for r in records
+    )
+
+    reasons = []
+    # Skipped without catalog text to compare against, or too little new
+    # text for the rate to mean anything
+    if (
+        baseline_oov is not None
+        and new_tokens >= DRIFT_MIN_TOKENS
+        and new_oov - baseline_oov > OOV_DRIFT_THRESHOLD
+    ):
+        reasons.append(f"out-of-vocabulary tokens {new_oov:.1%} vs {baseline_oov:.1%} expected for catalog text")
+    if unknown_genres:
+        reasons.append(f"genres unseen at training time: {', '.join(unknown_genres)}")
+    if years_out_of_range:
+        reasons.append(f"{years_out_of_range} years outside the trained range {year_min:.0f}-{year_max:.0f}")
+    return {
+        "rows": len(records),
+        "baseline_oov_rate": baseline_oov,
+        "oov_rate": new_oov,
+        "unknown_genres": unknown_genres,
+        "years_out_of_range": int(years_out_of_range),
+        "reasons": reasons,
+    }
+
+
+def _merged_catalog(catalog, candidates, appended, changed):
+    # Existing rows keep their ids (changed ones are replaced in place), new
+    # rows are appended, so cached ids and neighbour ids stay valid
+    records = catalog.records(range(len(catalog)))
+    for movie_id, row in changed.items():
+        records[movie_id] = candidates.record(row)
+    records.extend(candidates.record(row) for row in appended)
+    frame = pd.DataFrame(records, columns=["title", "year", "genre", "industry", "overview"])
+    return Catalog.from_dataframe(frame)
+
+
+def incremental_update(model_dir=MODEL_DIR, data_path=DATA_PATH, dry_run=False):
+    """Embed only new or changed movies with the trained model and append them.
+
+    Rows removed from the data file are kept, so ids stay stable; run a full
+    `model.py` training to drop them.
+    """
+    # 1. Current artifacts and the trained pipeline
+    bundle = load_artifact_bundle(model_dir)
+    catalog = bundle.catalog
+    existing_hashes = bundle.content_hashes
+    if existing_hashes is None:
+        existing_hashes = catalog.content_hashes()
+
+    # 2. Diff the data file against the catalog by content hash
+    # Titles are unique in the catalog; keep the last duplicate like data_loader.py
+    frame = pd.read_csv(data_path).drop_duplicates(subset=["title"], keep="last")
+    candidates = Catalog.from_dataframe(prepare_frame(frame))
+    appended, changed = plan_update(catalog, existing_hashes, candidates)
+    rows = list(changed.values()) + appended
+    records = candidates.records(rows)
+    print(f"{len(appended)} new and {len(changed)} changed movies (catalog has {len(catalog)})")
+
+    featurizer = Featurizer.load(model_dir)
+    report = drift_report(featurizer, catalog, records) if records else {"rows": 0, "reasons": []}
+    if len(appended) > APPEND_RETRAIN_FRACTION * len(catalog):
+        report["reasons"].append(f"{len(appended)} new movies is over {APPEND_RETRAIN_FRACTION:.0%} of the catalog")
+    report["retrain_recommended"] = bool(report["reasons"])
+    for reason in report["reasons"]:
+        print(f"Drift: {reason}")
+    if report["retrain_recommended"]:
+        print("A full retrain (python backend/model.py) is recommended")
+    if not records or dry_run:
+        return report
+
+    # 3. Featurize and embed only the affected rows
+    state_dict = torch.load(os.path.join(model_dir, "model.pt"), map_location="cpu")
+    encoder = EncoderInference(state_dict)
+    features = featurizer.transform(
+        [r["overview"] or "" for r in records],
+        [r["genre"] or [] for r in records],
+        [r["year"] or 2000 for r in records],
+    )
+    new_vectors = normalize_rows(encoder.embed(features))
+
+    embeddings = np.empty((len(catalog) + len(appended), new_vectors.shape[1]), dtype=np.float32)
+    embeddings[:len(catalog)] = normalize_rows(bundle.embeddings)
+    updated_ids = np.concatenate([
+        np.fromiter(changed.keys(), dtype=np.int64, count=len(changed)),
+        np.arange(len(catalog), len(embeddings)),
+    ])
+    embeddings[updated_ids] = new_vectors
+
+    merged = _merged_catalog(catalog, candidates, appended, changed)
+    hashes = np.concatenate([np.asarray(existing_hashes, dtype=np.uint64), np.zeros(len(appended), dtype=np.uint64)])
+    hashes[updated_ids] = [content_hash(r) for r in records]
+
+    # 4. Indexes first, bundle last: the new manifest is what triggers a
+    # reload. The bundle is staged up front so the indexes can record its version
+    manifest, staged_dir = stage_bundle(
+        model_dir,
+        embeddings,
+        merged,
+        content_hashes=hashes,
+        extra_manifest={
+            "incremental": {
+                "base_version": bundle.version,
+                "appended": len(appended),
+                "changed": len(changed),
+                "retrain_recommended": report["retrain_recommended"],
+            }
+        },
+    )
+    if os.path.exists(os.path.join(model_dir, NEIGHBOURS_FILENAME)):
+        start = time.perf_counter()
+        neighbours = load_neighbour_table(model_dir, version=bundle.version)
+        if neighbours is not None and len(neighbours) == len(catalog):
+            neighbours = update_neighbour_table(neighbours, embeddings, updated_ids)
+        else:
+            neighbours = build_neighbour_table(embeddings)
+        save_neighbour_table(model_dir, neighbours, version=manifest["version"])
+        print(f"Updated neighbour table in {time.perf_counter() - start:.1f}s")
+
+    ivf = load_ivf_index(model_dir, normalize_rows(bundle.embeddings), version=bundle.version)
+    if ivf is not None:
+        # Keep the trained centroids and only refill the inverted lists
+        IVFIndex.from_centroids(embeddings, ivf.centroids, nprobe=ivf.nprobe).save(
+            os.path.join(model_dir, IVF_FILENAME), version=manifest["version"]
+        )
+        print(f"Updated IVF index ({ivf.nlist} lists)")
+    else:
+        # No index (nothing to do) or one built for other artifacts: re-cluster
+        ivf = rebuild_ivf_index(model_dir, embeddings, manifest["version"])
+        if ivf is not None:
+            print(f"Rebuilt stale IVF index ({ivf.nlist} lists)")
+
+    quantized = load_quantized_index(model_dir, normalize_rows(bundle.embeddings), version=bundle.version)
+    if quantized is not None:
+        # Keep the trained codec and only re-encode the rows
+        codes = quantized.codec.encode(normalize_rows(embeddings))
+        QuantizedIndex(quantized.codec, codes, embeddings, quantized.rerank_factor).save(
+            os.path.join(model_dir, QUANTIZED_FILENAME), version=manifest["version"]
+        )
+        print(f"Updated {quantized.kind} codes")
+    else:
+        # No codes (nothing to do) or codes built for other artifacts: retrain
+        quantized = rebuild_quantized_index(model_dir, embeddings, manifest["version"])
+        if quantized is not None:
+            print(f"Rebuilt stale {quantized.kind} codes")
+
+    publish_bundle(model_dir, staged_dir)
+    print(f"Wrote artifact bundle {manifest['version']} ({manifest['rows']} movies)")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append new or changed movies without retraining")
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="Only report the diff and drift")
+    args = parser.parse_args()
+    incremental_update(MODEL_DIR, args.data, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from scipy import sparse
+
+from features import Featurizer
+
+# Configuration
+MODEL_DIR = "backend/artifacts"
+EMBEDDING_DIM = 64
+TORCHSCRIPT_FILENAME = "encoder.ts"
+ENCODER_MODES = ("eager", "torchscript", "int8")
+
+
+def to_torch_csr(features):
+    return torch.sparse_csr_tensor(
+        torch.from_numpy(features.indptr.astype(np.int64)),
+        torch.from_numpy(features.indices.astype(np.int64)),
+        torch.from_numpy(features.data.astype(np.float32)),
+        size=features.shape,
+    )
+
+
+class EncoderInference:
+    """Encoder-only embedding of sparse feature rows.
+
+    The autoencoder's decoder is never run. The first Linear is applied as a
+    sparse-dense matmul straight from the CSR features (a query touches a
+    handful of the input columns), and the remaining encoder layers run as:
+
+    - "eager": plain float32 modules
+    - "torchscript": a scripted and frozen graph
+    - "int8": dynamically quantized Linear layers (CPU only)
+    """
+
+    def __init__(self, state_dict, mode="eager", device=torch.device("cpu")):
+        if mode not in ENCODER_MODES:
+            raise ValueError(f"Unknown encoder mode '{mode}', expected one of {ENCODER_MODES}")
+        if mode == "int8":
+            device = torch.device("cpu")
+        self.mode = mode
+        self.device = device
+
+        first_weight = state_dict["encoder.0.weight"].float()
+        self.input_dim = first_weight.shape[1]
+        self.first_weight_t = first_weight.t().contiguous().to(device)
+        self.first_bias = state_dict["encoder.0.bias"].float().to(device)
+
+        hidden_dim = state_dict["encoder.2.weight"].shape[0]
+        embedding_dim = state_dict["encoder.4.weight"].shape[0]
+        tail = nn.Sequential(
+            nn.ReLU(),
+            nn.Linear(first_weight.shape[0], hidden_dim),
+            nn.ReLU(),
+            nn.Linear(hidden_dim, embedding_dim),
+        )
+        tail[1].load_state_dict({"weight": state_dict["encoder.2.weight"], "bias": state_dict["encoder.2.bias"]})
+        tail[3].load_state_dict({"weight": state_dict["encoder.4.weight"], "bias": state_dict["encoder.4.bias"]})
+        tail = tail.to(device).eval()
+
+        if mode == "torchscript":
+            tail = torch.jit.freeze(torch.jit.script(tail))
+        elif mode == "int8":
+            tail = torch.ao.quantization.quantize_dynamic(tail, {nn.Linear}, dtype=torch.qint8)
+        self.tail = tail
+
+    def embed(self, features):
+        # features: scipy CSR (n x input_dim) -> float32 embeddings (n x dim)
+        if features.shape[1] != self.input_dim:
+            raise ValueError(f"Expected {self.input_dim} input features, got {features.shape[1]}")
+        x = to_torch_csr(sparse.csr_matrix(features)).to(self.device)
+        with torch.no_grad():
+            hidden = torch.sparse.mm(x, self.first_weight_t) + self.first_bias
+            return self.tail(hidden).cpu().numpy()
+
+
+def export_torchscript(state_dict, path):
+    # Frozen TorchScript graph of the full (dense-input) encoder for use
+    # outside this process, e.g. from a C++ or mobile runtime
+    from model import MovieRecommenderNet # Pulls in pandas/sklearn via training; serving never needs it
+
+    input_dim = state_dict["encoder.0.weight"].shape[1]
+    model = MovieRecommenderNet(input_dim, EMBEDDING_DIM)
+    model.load_state_dict(state_dict)
+    encoder = torch.jit.freeze(torch.jit.script(model.encoder.eval()))
+    torch.jit.save(encoder, path)
+    return encoder
+
+
+def benchmark(model_dir, batch_sizes=(1, 8, 32), repeats=50, seed=0):
+    """Latency and embedding drift of each encoder mode vs. the full model.
+
+    The baseline is the original path: dense hstack + full autoencoder forward.
+    Drift is measured as the minimum cosine similarity and max absolute
+    difference between the baseline embeddings and each mode's embeddings.
+    """
+    from artifacts import load_artifact_bundle
+    from model import MovieRecommenderNet
+
+    state_dict = torch.load(os.path.join(model_dir, "model.pt"), map_location="cpu")
+    featurizer = Featurizer.load(model_dir)
+    model = MovieRecommenderNet(state_dict["encoder.0.weight"].shape[1], EMBEDDING_DIM)
+    model.load_state_dict(state_dict)
+    model.eval()
+    encoders = {mode: EncoderInference(state_dict, mode=mode) for mode in ENCODER_MODES}
+
+    catalog = load_artifact_bundle(model_dir, verify=False).catalog
+    rng = np.random.default_rng(seed)
+    rows = []
+    for batch_size in batch_sizes:
+        ids = rng.choice(len(catalog), batch_size, replace=False)
+        records = catalog.records(ids)
+        features = featurizer.transform(
+            [r["overview"] or "" for r in records],
+            [r["genre"] or [] for r in records],
+            [r["year"] or 2000 for r in records],
+        )
+
+        def baseline():
+            dense = torch.FloatTensor(features.toarray())
+            with torch.no_grad():
+                _, embedding = model(dense)
+            return embedding.numpy()
+
+        reference = baseline()
+        timings = {"baseline": _time(baseline, repeats)}
+        for mode, encoder in encoders.items():
+            embedded = encoder.embed(features)
+            timings[mode] = _time(lambda: encoder.embed(features), repeats)
+            cosine = np.sum(embedded * reference, axis=1) / (
+                np.linalg.norm(embedded, axis=1) * np.linalg.norm(reference, axis=1) + 1e-12
+            )
+            rows.append({
+                "batch_size": batch_size,
+                "mode": mode,
+                "latency_ms": timings[mode],
+                "baseline_ms": timings["baseline"],
+                "min_cosine": float(cosine.min()),
+                "max_abs_diff": float(np.abs(embedded - reference).max()),
+            })
+    return rows
+
+
+def _time(fn, repeats):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encoder-only inference tools")
+    parser.add_argument("command", choices=["benchmark", "export"])
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        state_dict = torch.load(os.path.join(MODEL_DIR, "model.pt"), map_location="cpu")
+        path = os.path.join(MODEL_DIR, TORCHSCRIPT_FILENAME)
+        export_torchscript(state_dict, path)
+        print(f"Saved frozen TorchScript encoder to {path}")
+        return
+
+    print(f"{'batch':>5} {'mode':>12} {'ms':>8} {'baseline':>9} {'min cos':>8} {'max diff':>9}")
+    for row in benchmark(MODEL_DIR, repeats=args.repeats):
+        print(
+            f"{row['batch_size']:>5} {row['mode']:>12} {row['latency_ms']:>8.3f} "
+            f"{row['baseline_ms']:>9.3f} {row['min_cosine']:>8.4f} {row['max_abs_diff']:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import numpy as np
+
+from similarity import top_k
+
+# Configuration
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+class LexicalIndex:
+    """BM25 inverted index over the catalog's title + overview text.
+
+    Text is tokenized with the fitted TF-IDF analyzer (same lowercasing,
+    token pattern and stop words as the model's features) but the vocabulary
+    is the catalog's own, so words outside the model's capped TF-IDF
+    vocabulary (most titles) are still matched. Each term has a posting list
+    of (doc id, BM25 weight) sorted by doc id, and its max weight as the
+    MaxScore upper bound.
+    """
+
+    def __init__(self, documents, analyzer=None, k1=BM25_K1, b=BM25_B):
+        from sklearn.feature_extraction.text import CountVectorizer # Deferred: sklearn is slow to import
+
+        self.vectorizer = CountVectorizer(analyzer=analyzer or "word", dtype=np.float32)
+        counts = self.vectorizer.fit_transform(documents).tocsr() if any(documents) else None
+        self.size = len(documents)
+        self.analyze = self.vectorizer.build_analyzer()
+        if counts is None or counts.nnz == 0:
+            self.vocabulary = {}
+            self.offsets = np.zeros(1, dtype=np.int64)
+            self.doc_ids = np.empty(0, dtype=np.int32)
+            self.weights = np.empty(0, dtype=np.float32)
+            self.max_weights = np.empty(0, dtype=np.float32)
+            return
+        self.vocabulary = self.vectorizer.vocabulary_
+
+        # BM25 term weight per (doc, term), computed on the CSR nonzeros
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        average = lengths.mean() or 1.0
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        idf = np.log1p((self.size - df + 0.5) / (df + 0.5)).astype(np.float32)
+        tf = counts.data
+        row_lengths = np.repeat(lengths, np.diff(counts.indptr))
+        counts.data = idf[counts.indices] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * row_lengths / average))
+
+        # Posting lists: the CSC layout of the same matrix
+        postings = counts.tocsc()
+        postings.sort_indices()
+        self.offsets = postings.indptr.astype(np.int64)
+        self.doc_ids = postings.indices.astype(np.int32)
+        self.weights = postings.data.astype(np.float32)
+        self.max_weights = np.maximum.reduceat(
+            np.append(self.weights, 0), np.minimum(self.offsets[:-1], len(self.weights))
+        ).astype(np.float32)
+        self.max_weights[np.diff(self.offsets) == 0] = 0
+
+    @classmethod
+    def from_catalog(cls, catalog, tfidf=None):
+        titles = catalog.title.tolist()
+        overviews = catalog.overview.tolist()
+        documents = [f"{title or ''} {overview or ''}" for title, overview in zip(titles, overviews)]
+        return cls(documents, analyzer=tfidf.build_analyzer() if tfidf is not None else None)
+
+    def __len__(self):
+        return self.size
+
+    def query_terms(self, text):
+        # (term ids, query term frequencies) for the terms the index knows
+        counts = {}
+        for token in self.analyze(text or ""):
+            term = self.vocabulary.get(token)
+            if term is not None:
+                counts[term] = counts.get(term, 0) + 1
+        terms = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        return terms, np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+    def postings(self, term):
+        start, end = self.offsets[term], self.offsets[term + 1]
+        return self.doc_ids[start:end], self.weights[start:end]
+
+    def score_docs(self, terms, query_weights, doc_ids):
+        # Exact BM25 scores of the given docs (posting lookups, no scan)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        scores = np.zeros(len(doc_ids), dtype=np.float32)
+        for term, query_weight in zip(terms, query_weights):
+            ids, weights = self.postings(term)
+            if len(ids) == 0:
+                continue
+            positions = np.minimum(np.searchsorted(ids, doc_ids), len(ids) - 1)
+            found = ids[positions] == doc_ids
+            scores[found] += query_weight * weights[positions[found]]
+        return scores
+
+    def search(self, terms, query_weights, k, mask=None):
+        """Top-k docs by BM25 with MaxScore early termination.
+
+        Terms are visited from the highest upper bound down. Postings are
+        merged into the candidate set only while a doc matching just the
+        remaining terms could still reach the current k-th best score; after
+        that, the remaining (low-impact, usually long) lists are only probed
+        for the candidates that can still make the top k.
+        Returns (doc ids, scores, postings visited).
+        """
+        if len(terms) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), 0
+        bounds = query_weights * self.max_weights[terms]
+        order = np.argsort(-bounds, kind="stable")
+        terms, query_weights, bounds = terms[order], query_weights[order], bounds[order]
+        # remaining[i]: best score a doc can get from terms i onwards
+        remaining = np.append(np.cumsum(bounds[::-1])[::-1], 0)
+
+        # 1. Essential terms: merge whole posting lists
+        candidates = np.empty(0, dtype=np.int32)
+        scores = np.empty(0, dtype=np.float32)
+        visited = 0
+        i = 0
+        while i < len(terms):
+            if len(candidates) >= k and _kth_best(scores, k) >= remaining[i]:
+                break
+            ids, weights = self.postings(terms[i])
+            if mask is not None:
+                keep = mask[ids]
+                ids, weights = ids[keep], weights[keep]
+            visited += len(ids)
+            merged = np.union1d(candidates, ids)
+            merged_scores = np.zeros(len(merged), dtype=np.float32)
+            merged_scores[np.searchsorted(merged, candidates)] = scores
+            merged_scores[np.searchsorted(merged, ids)] += query_weights[i] * weights
+            candidates, scores = merged, merged_scores
+            i += 1
+
+        # 2. Non-essential terms: drop candidates that cannot reach the
+        # k-th best even with every remaining term, then probe the rest
+        for j in range(i, len(terms)):
+            if len(candidates) > k:
+                alive = scores + remaining[j] >= _kth_best(scores, k)
+                candidates, scores = candidates[alive], scores[alive]
+            ids, weights = self.postings(terms[j])
+            if len(ids) == 0:
+                continue
+            visited += len(candidates)
+            positions = np.minimum(np.searchsorted(ids, candidates), len(ids) - 1)
+            found = ids[positions] == candidates
+            scores[found] += query_weights[j] * weights[positions[found]]
+
+        best = top_k(scores, k)
+        return candidates[best].astype(np.int64), scores[best], visited
+
+
+def _kth_best(scores, k):
+    return np.partition(scores, len(scores) - k)[len(scores) - k]
+
+
+def hybrid_search(vectors, lexical, query_vector, text, k, embedding_ids, lexical_weight, n_lexical, mask=None):
+    """Fuse embedding neighbours with BM25 matches for one plot query.
+
+    The union of `embedding_ids` (from the similarity index) and the top
+    `n_lexical` BM25 docs is re-scored on both signals: cosine similarity
+    against the normalized `vectors`, and BM25 scaled to [0, 1] by the best
+    candidate. Only docs sharing a query term are ever scored lexically.
+    Returns the top-k ids by (1 - w) * cosine + w * bm25.
+    """
+    terms, query_weights = lexical.query_terms(text)
+    lexical_ids, _, _ = lexical.search(terms, query_weights, n_lexical, mask=mask)
+    if len(lexical_ids) == 0:
+        return np.asarray(embedding_ids[:k], dtype=np.int64)
+
+    candidates = np.union1d(np.asarray(embedding_ids, dtype=np.int64), lexical_ids)
+    cosine = np.asarray(vectors[candidates], dtype=np.float32) @ query_vector
+    bm25 = lexical.score_docs(terms, query_weights, candidates)
+    fused = (1 - lexical_weight) * cosine + lexical_weight * bm25 / max(float(bm25.max()), 1e-12)
+    return candidates[top_k(fused, k)]
@@ -1,10 +1,14 @@
-from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-import torch
-import pandas as pd
+from fastapi.responses import Response
 import numpy as np
-import pickle
+import asyncio
+import contextvars
+from contextlib import asynccontextmanager
 import os
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 from pydantic import BaseModel
 
@@ -12,9 +16,22 @@ from pydantic import BaseModel
 # We need to make sure backend directory is in path or we import relatively if running from root
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from model import MovieRecommenderNet
+from batching import MicroBatcher
+from cache import ResultCache, backend_from_address
+from lexical import hybrid_search
+from metrics import current_stages, registry, stage
+from request_log import RequestLog
+from serialization import FastJSONResponse, dumps
+from similarity import normalize_rows
+from state import ModelUnavailable, StateManager, load_state
 
-app = FastAPI(title="Neural Movie Recommender")
+@asynccontextmanager
+async def lifespan(app):
+    await load_artifacts()
+    yield
+    await stop_background_tasks()
+
+app = FastAPI(title="Neural Movie Recommender", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -25,42 +42,117 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.01)) # Share of ordinary requests logged (errors and slow ones always are)
+
+# Metrics exposed on /metrics (see metrics.py)
+requests_total = registry.counter(
+    "recommender_requests_total", "Requests handled", ("method", "route", "status")
+)
+request_seconds = registry.histogram(
+    "recommender_request_seconds", "Request latency", ("method", "route")
+)
+requests_in_progress = registry.gauge("recommender_requests_in_progress", "Requests being handled")
+artifact_info = registry.gauge("recommender_artifact_info", "Artifact version being served", ("version",))
+catalog_movies = registry.gauge("recommender_catalog_movies", "Movies in the served catalog")
+startup_seconds = registry.gauge("recommender_startup_seconds", "Time spent in each startup stage", ("stage",))
+model_ready = registry.gauge("recommender_model_ready", "1 once the plot-query model is loaded")
+cache_gauges = {
+    name: registry.gauge(f"recommender_cache_{name}", help_text)
+    for name, help_text in [
+        ("entries", "Entries in the result cache"),
+        ("hits", "Result cache hits"),
+        ("misses", "Result cache misses"),
+        ("evictions", "Result cache evictions"),
+        ("hit_rate", "Result cache hit rate"),
+    ]
+}
+request_log = RequestLog(sample_rate=LOG_SAMPLE_RATE)
+in_progress = 0
+
 @app.middleware("http")
-async def log_requests(request: Request, call_next):
-    import json
+async def observe_requests(request: Request, call_next):
+    # Counts and times every request under its route template (not the raw
+    # path, so /recommend/{movie_id} is one series) and hands a structured
+    # record to the background request log
+    global in_progress
+    stages = {}
+    token = current_stages.set(stages)
+    in_progress += 1
+    requests_in_progress.set(in_progress)
+    start = time.perf_counter()
+    status = 500
     try:
-        body = await request.body()
-        print(f"Request: {request.method} {request.url}")
-        if body:
-            print(f"Body: {body.decode()}")
-    except Exception as e:
-        print(f"Error reading body: {e}")
-    
-    response = await call_next(request)
-    return response
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        seconds = time.perf_counter() - start
+        in_progress -= 1
+        requests_in_progress.set(in_progress)
+        current_stages.reset(token)
+        route = request.scope.get("route")
+        route = route.path if route is not None else "unmatched"
+        requests_total.inc(method=request.method, route=route, status=status)
+        request_seconds.observe(seconds, method=request.method, route=route)
+        request_log.log(
+            status,
+            seconds,
+            method=request.method,
+            route=route,
+            path=request.url.path,
+            query=request.url.query or None,
+            stages_ms={name: round(value * 1000, 3) for name, value in stages.items()},
+        )
 
 @app.get("/")
 async def root():
     return {"status": "alive", "message": "Movie Recommender API is running"}
 
-# Global variables to hold model and data
-model = None
-movies_df = None
-embeddings = None
-tfidf = None
-mlb = None
-scaler = None
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+device = None # torch device for the encoder; None picks cuda when available once torch is loaded
 
 MODEL_DIR = "backend/artifacts"
 EMBEDDING_DIM = 64
-INPUT_DIM = 0 # Will be inferred from model state or config
+INPUT_DIM = 0 # Will be inferred from model state or config (see ServingState.input_dim)
+VERIFY_ARTIFACTS = True # Checksum the bundle files against the manifest on load
+ENCODER_MODE = "eager" # "eager", "torchscript" or "int8" (see inference.py)
+MODEL_LOADING = os.environ.get("MODEL_LOADING", "background") # "background", "lazy" (first plot query) or "eager" (before serving)
+CACHE_MAX_ENTRIES = 4096 # Recommendation results kept in the result cache
+CACHE_TTL_SECONDS = 300
+CACHE_SERVER = os.environ.get("CACHE_SERVER") # "host:port" of a shared cache (python backend/cache.py)
+PLOT_BATCH_MAX_SIZE = 32 # Max concurrent plot queries embedded together
+PLOT_BATCH_MAX_WAIT_MS = 5 # How long the first query waits for others to join
+PLOT_LEXICAL_WEIGHT = 0.3 # Share of BM25 keyword matching in the plot ranking, 0 = embeddings only
+PLOT_CANDIDATE_FACTOR = 4 # Embedding and BM25 candidates fetched per requested result for fusion
+ARTIFACT_WATCH_SECONDS = float(os.environ.get("ARTIFACT_WATCH_SECONDS", 0)) # Poll interval for hot reload, 0 disables
+SUPERVISOR_PID = None # Set by serve.py; reloads are then done once by that process for every worker
+BATCH_MAX_SEEDS = 100 # Seeds accepted by one /recommend/batch request
+COMPUTE_THREADS = int(os.environ.get("COMPUTE_THREADS", min(4, os.cpu_count() or 1))) # Threads running handler numpy/torch work, 0 runs it inline
+
+# CPU-bound handler work runs here instead of on the event loop. numpy and
+# torch release the GIL, so a few threads overlap; the bound keeps a burst
+# of requests from oversubscribing the cores (see serve.py for workers)
+compute_pool = ThreadPoolExecutor(max_workers=COMPUTE_THREADS, thread_name_prefix="compute") if COMPUTE_THREADS > 0 else None
+
+async def run_compute(fn, *args):
+    # Run fn(*args) on the compute pool; the context is copied so stage
+    # timings still land in the calling request's record
+    if compute_pool is None:
+        return fn(*args)
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(compute_pool, context.run, fn, *args)
+
+result_cache = ResultCache(
+    ttl_seconds=CACHE_TTL_SECONDS,
+    backend=backend_from_address(CACHE_SERVER, CACHE_MAX_ENTRIES),
+)
 
 from typing import List, Optional, Union
 
 class Movie(BaseModel):
+    # Documents the response schema; responses are pre-encoded (see
+    # serialization.EncodedCatalog) and not validated against it per item
     id: int
-    title: str
+    title: Optional[str] = None
     year: Optional[Union[str, int, float]] = None
     genre: Optional[Union[List[str], str]] = None
     overview: Optional[str] = None
@@ -70,207 +162,489 @@ class Movie(BaseModel):
         # Allow population by field name (if we rename index to id)
         populate_by_name = True
 
+class SearchFilters(BaseModel):
+    # Restricts results to matching movies; industries match by substring,
+    # any of `genres` qualifies, and the year range is inclusive
+    industry: Optional[str] = None
+    genres: List[str] = []
+    year_min: Optional[int] = None
+    year_max: Optional[int] = None
+
 class PlotRequest(BaseModel):
     overview: str
     year: int = 2024
     genres: List[str] = []
     k: int = 5
+    filters: Optional[SearchFilters] = None
+
+class Seed(BaseModel):
+    # Resolved by movie_id, else the best title match, else embedded from
+    # overview/year/genres like a /recommend_by_plot query
+    movie_id: Optional[int] = None
+    title: Optional[str] = None
+    overview: Optional[str] = None
+    year: int = 2024
+    genres: List[str] = []
+    weight: float = 1.0 # Share of this seed in the profile centroid
+
+class BatchRecommendRequest(BaseModel):
+    seeds: List[Seed]
+    k: int = 10
+    per_seed: bool = True # Top-k for every seed on its own
+    profile: bool = True # Top-k for the weighted centroid of all seeds, seeds excluded
+    filters: Optional[SearchFilters] = None
+
+class SeedRecommendations(BaseModel):
+    movie_id: Optional[int] = None # Catalog id the seed resolved to, if any
+    results: List[Movie] = []
+
+class BatchRecommendResponse(BaseModel):
+    seeds: List[SeedRecommendations] = []
+    profile: List[Movie] = []
+
+def search_filters(
+    industry: Optional[str] = None,
+    genres: List[str] = Query([]),
+    year_min: Optional[int] = None,
+    year_max: Optional[int] = None,
+):
+    # Query-string form of SearchFilters, e.g. ?genres=Action&genres=Drama&year_min=2020
+    return SearchFilters(industry=industry, genres=genres, year_min=year_min, year_max=year_max)
+
+def filter_mask(state, filters):
+    # Precomputed boolean row mask (see filters.py), None when unfiltered
+    if filters is None:
+        return None
+    return state.filters.mask(filters.industry or None, filters.genres, filters.year_min, filters.year_max)
+
+def clear_cache_on_swap(previous, state):
+    # Cache keys include the version; clearing just frees the old entries, so
+    # a remote clear can finish in the background
+    if result_cache.backend.blocking:
+        asyncio.get_running_loop().run_in_executor(None, result_cache.clear)
+    else:
+        result_cache.clear()
+    if previous is not None:
+        print(f"Swapped artifacts {previous.version} -> {state.version}")
+
+# All model and data live in one immutable ServingState (see state.py).
+# Handlers read state_manager.current once and use only that object, so a
+# reload never changes anything under an in-flight request.
+state_manager = StateManager(
+    lambda: load_state(MODEL_DIR, verify=VERIFY_ARTIFACTS, encoder_mode=ENCODER_MODE, device=device),
+    MODEL_DIR,
+    on_swap=clear_cache_on_swap,
+)
+
+def get_state():
+    state = state_manager.current
+    if state is None:
+        raise HTTPException(status_code=503, detail="System not ready")
+    return state
+
+async def warm_model(state):
+    # Loads torch, the preprocessors and the encoder off the event loop while
+    # the catalog endpoints are already serving
+    global INPUT_DIM
+    try:
+        components = await asyncio.to_thread(state.model.load)
+        INPUT_DIM = components.input_dim
+    except ModelUnavailable as e:
+        print(f"Error loading model: {e}")
+        print("Plot queries will retry the load; catalog endpoints keep serving.")
+
+model_warmup = None
 
-@app.on_event("startup")
 async def load_artifacts():
-    global model, movies_df, embeddings, INPUT_DIM, tfidf, mlb, scaler
+    global INPUT_DIM, model_warmup
+    
+    request_log.start()
+    if state_manager.current is not None:
+        # Preloaded by the parent process before forking (serve.py)
+        INPUT_DIM = state_manager.current.input_dim
+    else:
+        # 1. Catalog, embeddings and indexes first: enough for /movies,
+        # /recommend/{id} and title search
+        print("Loading artifacts...")
+        eager = MODEL_LOADING == "eager"
+        try:
+            state = await state_manager.reload(lambda: load_state(
+                MODEL_DIR, verify=VERIFY_ARTIFACTS, encoder_mode=ENCODER_MODE, device=device, load_model=eager,
+            ))
+            print("Artifacts loaded successfully!")
+        except Exception as e:
+            print(f"Error loading artifacts: {e}")
+            print("Ensure you have run 'python backend/model.py' first.")
+        else:
+            # 2. The plot-query model, now in the background or on first use
+            if eager:
+                INPUT_DIM = state.input_dim
+            elif MODEL_LOADING == "background":
+                model_warmup = asyncio.get_running_loop().create_task(warm_model(state))
     
-    print("Loading artifacts...")
+    if ARTIFACT_WATCH_SECONDS > 0:
+        state_manager.start_watching(ARTIFACT_WATCH_SECONDS)
+
+@app.get("/livez")
+async def liveness():
+    # The process is up and the event loop is responsive; says nothing about data
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness(model: bool = False):
+    # Ready once the catalog state is loaded; ?model=true also waits for the
+    # plot-query model. 503 until then, so a balancer holds traffic back
+    state = state_manager.current
+    model_loaded = state is not None and state.model.ready
+    ready = state is not None and (model_loaded or not model)
+    body = {
+        "status": "ready" if ready else "starting",
+        "artifact_version": state.version if state else None,
+        "components": {"catalog": state is not None, "model": model_loaded},
+        "model_error": state.model.error if state else None,
+        "last_reload_error": state_manager.last_error,
+        "startup_seconds": {name: round(value, 3) for name, value in list(state.startup_seconds.items())} if state else {},
+    }
+    return FastJSONResponse(body, status_code=200 if ready else 503)
+
+@app.post("/admin/reload")
+async def reload_artifacts():
+    # Loads the new artifacts in the background; requests keep being served
+    # from the current state until the new one is validated and swapped in
+    previous = state_manager.current
+    if SUPERVISOR_PID is not None:
+        # Under serve.py a reload here would update only this worker and
+        # unshare its pages; the parent loads once and replaces every worker
+        os.kill(SUPERVISOR_PID, signal.SIGHUP)
+        return FastJSONResponse(
+            {"status": "reloading", "previous_version": previous.version if previous else None},
+            status_code=202,
+        )
     try:
-        # Load Metadata/Dataframe
-        movies_df = pd.read_pickle(os.path.join(MODEL_DIR, "movies_metadata.pkl"))
-        movies_df['overview'] = movies_df['overview'].fillna("")
-        
-        # Load Embeddings
-        with open(os.path.join(MODEL_DIR, "embeddings.pkl"), "rb") as f:
-            embeddings = pickle.load(f)
-            
-        # Load Preprocessors
-        with open(os.path.join(MODEL_DIR, "tfidf.pkl"), "rb") as f:
-            tfidf = pickle.load(f)
-        with open(os.path.join(MODEL_DIR, "mlb.pkl"), "rb") as f:
-            mlb = pickle.load(f)
-        with open(os.path.join(MODEL_DIR, "scaler.pkl"), "rb") as f:
-            scaler = pickle.load(f)
-            
-        # Load Model
-        state_dict = torch.load(os.path.join(MODEL_DIR, "model.pt"), map_location=device)
-        INPUT_DIM = state_dict['encoder.0.weight'].shape[1]
-        
-        model = MovieRecommenderNet(INPUT_DIM, EMBEDDING_DIM).to(device)
-        model.load_state_dict(state_dict)
-        model.eval()
-        
-        print("Artifacts loaded successfully!")
+        state = await state_manager.reload()
     except Exception as e:
-        print(f"Error loading artifacts: {e}")
-        print("Ensure you have run 'python backend/model.py' first.")
+        raise HTTPException(status_code=409, detail=f"Reload rejected: {e}")
+    return {
+        "previous_version": previous.version if previous else None,
+        "version": state.version,
+        "movies": len(state.catalog),
+    }
 
 @app.get("/movies", response_model=dict)
 async def get_movies(
     page: int = 1, 
     limit: int = 20, 
     search: Optional[str] = None,
-    industry: Optional[str] = None
+    filters: SearchFilters = Depends(search_filters)
 ):
-    if movies_df is None:
-        raise HTTPException(status_code=503, detail="System not ready")
-        
-    filtered = movies_df.copy()
+    state = get_state()
+    if not search:
+        # A page of the (optionally filtered) catalog is cheaper than a thread hop
+        return FastJSONResponse(list_movies(state, page, limit, search, filters))
+    return FastJSONResponse(await run_compute(list_movies, state, page, limit, search, filters))
+
+def list_movies(state, page, limit, search, filters):
+    ids = np.arange(len(state.catalog))
     
-    if search:
-        filtered = filtered[filtered['title'].str.contains(search, case=False, na=False)]
-        
-    if industry:
-        filtered = filtered[filtered['industry'].str.contains(industry, case=False, na=False)]
+    with stage("search"):
+        if search:
+            # Ranked: exact title, then prefix, then substring matches
+            ids = state.title_index.search(search)
+            
+        mask = filter_mask(state, filters)
+        if mask is not None:
+            ids = ids[mask[ids]]
         
-    total = len(filtered)
+    total = len(ids)
     start = (page - 1) * limit
     end = start + limit
     
-    results_df = filtered.iloc[start:end].copy()
-    if 'index' in results_df.columns:
-        results_df['id'] = results_df['index']
-    else:
-        results_df['id'] = results_df.index
-        
-    results = results_df.to_dict(orient='records')
-    
-    for r in results:
-        for k, v in r.items():
-            if isinstance(v, float) and np.isnan(v):
-                r[k] = None
-    
-    return {
-        "total": total,
-        "page": page,
-        "limit": limit,
-        "data": results
-    }
+    with stage("serialize"):
+        results = state.encoded.movies(ids[start:end], with_index=True)
+    return b'{"total":%d,"page":%d,"limit":%d,"data":%s}' % (total, page, limit, results)
 
 @app.get("/recommend_by_title", response_model=List[str])
-async def recommend_by_title(title: str, k: int = 5):
-    if embeddings is None or movies_df is None:
-        raise HTTPException(status_code=503, detail="System not ready")
+async def recommend_by_title(title: str, k: int = 5, filters: SearchFilters = Depends(search_filters)):
+    state = get_state()
 
-    # 1. Find the closest match in our local dataset
-    import difflib
-    
-    # Get all titles (ensure strings)
-    all_titles = [str(t) for t in movies_df['title'].dropna().tolist()]
+    # 1. Find the closest match in our local dataset (exact, prefix, fuzzy, then substring).
+    # Keyed on the resolved id: titles that normalize alike can be different movies
+    with stage("title_lookup"):
+        movie_idx = state.title_index.best_match(title)
+    if movie_idx is None:
+        raise HTTPException(status_code=404, detail=f"Movie '{title}' not found in AI database")
+
+    cache_key = ResultCache.key(
+        "recommend_by_title", state.version, movie_id=movie_idx, k=k, filters=filters.model_dump()
+    )
+    hit, cached = await result_cache.aget(cache_key)
+    if hit:
+        return FastJSONResponse(cached)
+
+    recommended_titles = await run_compute(titles_like, state, movie_idx, k, filters)
+    await result_cache.aset(cache_key, recommended_titles)
     
-    # Find close matches
-    matches = difflib.get_close_matches(title, all_titles, n=1, cutoff=0.6)
+    return FastJSONResponse(recommended_titles)
+
+def titles_like(state, movie_idx, k, filters):
+    # 2. Run the Neural Network Logic (Cosine Similarity), filters applied inside the scan
+    with stage("search"):
+        top_k_indices, _ = state.similarity_index.search_by_id(movie_idx, k, mask=filter_mask(state, filters))
     
-    if not matches:
-        # Try simple containment if fuzzy fails
-        matches = movies_df[movies_df['title'].str.contains(title, case=False, na=False)]['title'].tolist()
-        if not matches:
-             raise HTTPException(status_code=404, detail=f"Movie '{title}' not found in AI database")
+    # 3. Return only the titles
+    with stage("serialize"):
+        return state.catalog.titles(top_k_indices)
+
+def recommend_plots(state, requests):
+    # One featurization, one encoder pass and one similarity GEMM for a
+    # whole batch of plot queries
     
-    matched_title = matches[0]
+    # 1. Preprocess Input as one sparse batch
+    with stage("featurize"):
+        features = state.featurizer.transform(
+            [r.overview for r in requests],
+            [r.genres for r in requests],
+            [r.year for r in requests],
+        )
     
-    # Get the index of the matched movie
-    movie_idx = movies_df[movies_df['title'] == matched_title].index[0]
+    # 2. Get Embeddings from the encoder (sparse first layer, no decoder)
+    with stage("encode"):
+        query_vecs = state.encoder.embed(features)
     
-    # 2. Run the Neural Network Logic (Cosine Similarity)
-    query_vec = embeddings[movie_idx]
-    norm_query = np.linalg.norm(query_vec)
-    norm_all = np.linalg.norm(embeddings, axis=1)
-    dot_products = np.dot(embeddings, query_vec)
-    similarities = dot_products / (norm_all * norm_query)
+    # 3. Cosine Similarity (Top K): one search for all queries sharing a filter
+    factor = PLOT_CANDIDATE_FACTOR if PLOT_LEXICAL_WEIGHT > 0 else 1
+    with stage("search"):
+        groups = {}
+        for position, request in enumerate(requests):
+            mask = filter_mask(state, request.filters)
+            groups.setdefault(id(mask), (mask, []))[1].append(position)
+        top_k_indices = [None] * len(requests)
+        masks = [None] * len(requests)
+        for mask, positions in groups.values():
+            max_k = max(requests[p].k for p in positions)
+            indices, _ = state.similarity_index.search_batch(query_vecs[positions], max_k * factor, mask=mask)
+            for position, row in zip(positions, indices):
+                top_k_indices[position] = row
+                masks[position] = mask
     
-    # Top K
-    top_k_indices = np.argsort(similarities)[-(k+1):][::-1]
-    top_k_indices = [i for i in top_k_indices if i != movie_idx][:k]
+    # 4. Fuse with BM25 keyword matches, scoring only docs that share a term
+    if PLOT_LEXICAL_WEIGHT > 0:
+        with stage("lexical"):
+            for position, (request, query_vec) in enumerate(zip(requests, query_vecs)):
+                if not np.any(query_vec):
+                    continue
+                top_k_indices[position] = hybrid_search(
+                    state.similarity_index.vectors,
+                    state.lexical,
+                    normalize_rows(query_vec)[0],
+                    request.overview,
+                    max(request.k, 0),
+                    top_k_indices[position],
+                    PLOT_LEXICAL_WEIGHT,
+                    max(request.k, 0) * PLOT_CANDIDATE_FACTOR,
+                    mask=masks[position],
+                )
     
-    # 3. Return only the titles
-    recommended_titles = movies_df.iloc[top_k_indices]['title'].tolist()
+    # Return titles per query
+    results = []
+    for request, query_vec, indices in zip(requests, query_vecs, top_k_indices):
+        if not np.any(query_vec):
+            results.append([])
+            continue
+        results.append(state.catalog.titles(indices[:max(request.k, 0)]))
+    return results
+
+def recommend_plot_batch(items):
+    # Runs in a worker thread. Items are (state, request) pairs; a batch
+    # collected across a reload is split so each request is answered from
+    # the state it started with
+    groups = {}
+    for position, (state, request) in enumerate(items):
+        groups.setdefault(id(state), (state, []))[1].append(position)
     
-    return recommended_titles
+    results = [None] * len(items)
+    for state, positions in groups.values():
+        answers = recommend_plots(state, [items[p][1] for p in positions])
+        for position, answer in zip(positions, answers):
+            results[position] = answer
+    return results
+
+plot_batcher = MicroBatcher(
+    recommend_plot_batch,
+    max_batch_size=PLOT_BATCH_MAX_SIZE,
+    max_wait_ms=PLOT_BATCH_MAX_WAIT_MS,
+    executor=compute_pool,
+)
 
 @app.post("/recommend_by_plot", response_model=List[str])
 async def recommend_by_plot(request: PlotRequest):
-    if model is None or tfidf is None:
-        raise HTTPException(status_code=503, detail="System not ready")
-        
-    # 1. Preprocess Input
-    # Genres
-    genre_matrix = mlb.transform([request.genres])
-    
-    # Overview
-    overview_matrix = tfidf.transform([request.overview]).toarray()
-    
-    # Year
-    year_matrix = scaler.transform([[request.year]])
-    
-    # Combine
-    features = np.hstack([genre_matrix, overview_matrix, year_matrix])
-    
-    # 2. Get Embedding from Model
-    features_tensor = torch.FloatTensor(features).to(device)
-    with torch.no_grad():
-        _, query_embedding = model(features_tensor)
+    state = get_state()
         
-    query_vec = query_embedding.cpu().numpy()[0]
+    cache_key = ResultCache.key(
+        "recommend_by_plot",
+        state.version,
+        overview=" ".join(request.overview.split()),
+        year=request.year,
+        genres=sorted(request.genres),
+        k=request.k,
+        filters=request.filters.model_dump() if request.filters else None,
+    )
+    hit, cached = await result_cache.aget(cache_key)
+    if hit:
+        return FastJSONResponse(cached)
     
-    # 3. Cosine Similarity
-    norm_query = np.linalg.norm(query_vec)
-    norm_all = np.linalg.norm(embeddings, axis=1)
-    dot_products = np.dot(embeddings, query_vec)
-    similarities = dot_products / (norm_all * norm_query)
-    
-    # Top K
-    top_k_indices = np.argsort(similarities)[-(request.k):][::-1]
-    
-    # Return titles
-    recommended_titles = movies_df.iloc[top_k_indices]['title'].tolist()
-    
-    return recommended_titles
+    # Queue wait plus the shared featurize/encode/search of the whole batch
+    with stage("plot_batch"):
+        recommended_titles = await plot_batcher.submit((state, request))
+    await result_cache.aset(cache_key, recommended_titles)
+    return FastJSONResponse(recommended_titles)
+
+async def stop_background_tasks():
+    if model_warmup is not None and not model_warmup.done():
+        # The load thread itself cannot be interrupted; just stop waiting on it
+        model_warmup.cancel()
+    await plot_batcher.stop()
+    await state_manager.stop_watching()
+    request_log.stop()
 
 @app.get("/recommend/{movie_id}", response_model=List[Movie])
-async def recommend(movie_id: int, k: int = 10):
-    if embeddings is None or movies_df is None:
-        raise HTTPException(status_code=503, detail="System not ready")
+async def recommend(movie_id: int, k: int = 10, filters: SearchFilters = Depends(search_filters)):
+    state = get_state()
         
-    if movie_id < 0 or movie_id >= len(movies_df):
+    if movie_id < 0 or movie_id >= len(state.catalog):
         raise HTTPException(status_code=404, detail="Movie not found")
         
-    query_vec = embeddings[movie_id]
+    cache_key = ResultCache.key("recommend", state.version, movie_id=movie_id, k=k, filters=filters.model_dump())
+    hit, recommendation_ids = await result_cache.aget(cache_key)
+    if not hit:
+        # Cache the ids only; the Movie JSON is already encoded per row.
+        # Neighbour-table hits are answered inline, scans go to the pool
+        mask = filter_mask(state, filters)
+        with stage("search"):
+            precomputed = state.similarity_index.precomputed(movie_id, k, mask=mask)
+        if precomputed is not None:
+            recommendation_ids = precomputed[0].tolist()
+        else:
+            recommendation_ids = await run_compute(similar_ids, state, movie_id, k, mask)
+        await result_cache.aset(cache_key, recommendation_ids)
     
-    norm_query = np.linalg.norm(query_vec)
-    if norm_query == 0:
-        return []
-        
-    norm_all = np.linalg.norm(embeddings, axis=1)
-    dot_products = np.dot(embeddings, query_vec)
-    similarities = dot_products / (norm_all * norm_query)
+    with stage("serialize"):
+        body = state.encoded.movies(recommendation_ids)
+    return FastJSONResponse(body)
+
+def similar_ids(state, movie_id, k, mask):
+    with stage("search"):
+        top_k_indices, _ = state.similarity_index.search_by_id(movie_id, k, mask=mask)
+    return top_k_indices.tolist()
+
+def recommend_batch(state, request):
+    """Per-seed and profile recommendations for many seeds in one search.
+
+    Seeds are resolved to vectors (catalog rows, best title match, or one
+    encoder pass for all plot seeds), stacked with their weighted centroid
+    and scored together with a single search_batch call. Returns the
+    resolved seed ids, per-seed result ids and profile result ids.
+    """
+    seeds = request.seeds
+    vectors = state.similarity_index.vectors
+    queries = np.zeros((len(seeds), vectors.shape[1]), dtype=np.float32)
+    seed_ids = [None] * len(seeds)
     
-    top_k_indices = np.argsort(similarities)[-(k+1):][::-1]
-    top_k_indices = [i for i in top_k_indices if i != movie_id][:k]
+    # 1. Resolve catalog seeds by id or title
+    with stage("title_lookup"):
+        for position, seed in enumerate(seeds):
+            movie_id = seed.movie_id
+            if movie_id is None and seed.title is not None:
+                movie_id = state.title_index.best_match(seed.title)
+            if movie_id is not None and 0 <= movie_id < len(state.catalog):
+                seed_ids[position] = int(movie_id)
+                queries[position] = vectors[movie_id]
     
-    recommendations_df = movies_df.iloc[top_k_indices].copy()
+    # 2. Embed all plot seeds together
+    plots = [p for p, seed in enumerate(seeds) if seed_ids[p] is None and seed.overview is not None]
+    if plots:
+        with stage("featurize"):
+            features = state.featurizer.transform(
+                [seeds[p].overview for p in plots],
+                [seeds[p].genres for p in plots],
+                [seeds[p].year for p in plots],
+            )
+        with stage("encode"):
+            queries[plots] = normalize_rows(state.encoder.embed(features))
     
-    if 'index' in recommendations_df.columns:
-        recommendations_df['id'] = recommendations_df['index']
-    else:
-        recommendations_df['id'] = recommendations_df.index
+    # 3. Profile: weighted centroid of the seeds that resolved to a vector
+    resolved = np.any(queries, axis=1)
+    weights = np.array([max(seed.weight, 0.0) for seed in seeds], dtype=np.float32) * resolved
+    rows = []
+    exclude = []
+    if request.per_seed:
+        rows.extend(range(len(seeds)))
+        exclude.extend([movie_id] if movie_id is not None else None for movie_id in seed_ids)
+    if request.profile and weights.sum() > 0:
+        queries = np.vstack([queries, weights @ queries / weights.sum()])
+        rows.append(len(seeds))
+        exclude.append([movie_id for movie_id in seed_ids if movie_id is not None])
+    
+    # 4. One search for every seed and the profile
+    results = {}
+    if rows:
+        with stage("search"):
+            mask = filter_mask(state, request.filters)
+            indices, _ = state.similarity_index.search_batch(queries[rows], request.k, exclude=exclude, mask=mask)
+        results = {row: ids.tolist() for row, ids in zip(rows, indices)}
+    
+    per_seed = []
+    if request.per_seed:
+        per_seed = [results[p] if resolved[p] else [] for p in range(len(seeds))]
+    return {"seed_ids": seed_ids, "per_seed": per_seed, "profile": results.get(len(seeds), [])}
 
-    recommendations = recommendations_df.to_dict(orient='records')
+@app.post("/recommend/batch", response_model=BatchRecommendResponse)
+async def recommend_batch_endpoint(request: BatchRecommendRequest):
+    # One round trip for many seeds (e.g. the onboarding picks) instead of
+    # one /recommend call per seed
+    state = get_state()
     
-    for r in recommendations:
-        for k, v in r.items():
-            if isinstance(v, float) and np.isnan(v):
-                r[k] = None
-                
-    return recommendations
-
-    return recommendations
+    if len(request.seeds) > BATCH_MAX_SEEDS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_SEEDS} seeds per request")
+    
+    cache_key = ResultCache.key("recommend_batch", state.version, request=request.model_dump())
+    hit, batch = await result_cache.aget(cache_key)
+    if not hit:
+        batch = await run_compute(recommend_batch, state, request)
+        await result_cache.aset(cache_key, batch)
+    
+    with stage("serialize"):
+        seeds = b",".join(
+            b'{"movie_id":%s,"results":%s}' % (dumps(movie_id), state.encoded.movies(ids))
+            for movie_id, ids in zip(batch["seed_ids"], batch["per_seed"])
+        )
+        body = b'{"seeds":[%s],"profile":%s}' % (seeds, state.encoded.movies(batch["profile"]))
+    return FastJSONResponse(body)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    state = state_manager.current
+    return {"artifact_version": state.version if state else None, **(await result_cache.astats())}
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format; gauges are read from the live state at scrape time
+    state = state_manager.current
+    artifact_info.clear()
+    if state is not None:
+        artifact_info.set(1, version=state.version)
+        catalog_movies.set(len(state.catalog))
+        for name, seconds in list(state.startup_seconds.items()):
+            startup_seconds.set(seconds, stage=name)
+        model_ready.set(int(state.model.ready))
+    for name, value in (await result_cache.astats()).items():
+        cache_gauges[name].set(value)
+    return Response(registry.render(), media_type=registry.content_type)
+
+@app.exception_handler(ModelUnavailable)
+async def model_unavailable_handler(request, exc):
+    # Only plot queries need the model; report it as temporarily unavailable
+    return FastJSONResponse({"detail": str(exc)}, status_code=503)
 
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
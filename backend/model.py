@@ -1,20 +1,26 @@
 import torch
 import torch.nn as nn
-import torch.optim as optim
 import pandas as pd
 import numpy as np
+import argparse
 import pickle
 import os
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import MultiLabelBinarizer, MinMaxScaler
-from torch.utils.data import DataLoader, TensorDataset
+
+from features import combine_features
+from training import PRECISIONS, LR_SCALING, TrainConfig, fit
+from neighbours import build_neighbour_table, save_neighbour_table
+from catalog import Catalog
+from artifacts import publish_bundle, stage_bundle
+from ann_index import rebuild_ivf_index
+from quantization import rebuild_quantized_index
 
 # Configuration
 DATA_PATH = "backend/data/movies.csv"
 MODEL_DIR = "backend/artifacts"
 EMBEDDING_DIM = 64
-EPOCHS = 5
-BATCH_SIZE = 64
+EMBED_CHUNK_SIZE = 4096 # Rows per forward pass when embedding the catalog
 
 class MovieRecommenderNet(nn.Module):
     def __init__(self, input_dim, embedding_dim):
@@ -45,68 +51,65 @@ class MovieRecommenderNet(nn.Module):
         with torch.no_grad():
             return self.encoder(x)
 
-def train_model():
+def embed_in_chunks(model, features, device, chunk_size=EMBED_CHUNK_SIZE):
+    # Encoder-only pass over the whole catalog, chunk_size rows at a time
+    model.eval()
+    chunks = []
+    for start in range(0, features.shape[0], chunk_size):
+        batch = torch.from_numpy(features[start:start + chunk_size].toarray()).to(device)
+        chunks.append(model.get_embedding(batch).cpu().numpy())
+    return np.concatenate(chunks) if chunks else np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+
+def prepare_frame(df):
+    # Column cleanup shared by training and incremental updates (incremental.py)
+    df['genre'] = df['genre'].astype(str).apply(lambda x: x.split(', '))
+    # Handle non-numeric years if any slipped through
+    df['year'] = pd.to_numeric(df['year'], errors='coerce').fillna(2000)
+    return df
+
+def train_model(config=None):
     print("Loading data...")
     if not os.path.exists(DATA_PATH):
         print("Data file not found!")
         return
 
-    df = pd.read_csv(DATA_PATH)
+    df = prepare_frame(pd.read_csv(DATA_PATH))
     
     # Preprocessing
     print("Preprocessing features...")
     
     # 1. Genres (Multi-hot)
-    df['genre'] = df['genre'].astype(str).apply(lambda x: x.split(', '))
     mlb = MultiLabelBinarizer()
     genre_matrix = mlb.fit_transform(df['genre'])
     
-    # 2. Overview (TF-IDF)
+    # 2. Overview (TF-IDF, kept sparse)
     # Limit features to keep model small and fast
     tfidf = TfidfVectorizer(max_features=2000, stop_words='english')
-    overview_matrix = tfidf.fit_transform(df['overview'].fillna('')).toarray()
+    overview_matrix = tfidf.fit_transform(df['overview'].fillna(''))
     
     # 3. Year (Normalized)
     scaler = MinMaxScaler()
-    # Handle non-numeric years if any slipped through
-    df['year'] = pd.to_numeric(df['year'], errors='coerce').fillna(2000)
     year_matrix = scaler.fit_transform(df[['year']])
     
     # Combine features
-    # Input vector = [Genre_Multi_Hot, Overview_TFIDF, Year_Norm]
-    features = np.hstack([genre_matrix, overview_matrix, year_matrix])
+    # Input vector = [Genre_Multi_Hot, Overview_TFIDF, Year_Norm] as float32 CSR
+    features = combine_features(genre_matrix, overview_matrix, year_matrix)
     input_dim = features.shape[1]
     
-    print(f"Input feature dimension: {input_dim}")
-    
-    # Convert to Tensor
-    dataset = TensorDataset(torch.FloatTensor(features))
-    dataloader = DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=True)
+    print(f"Input feature dimension: {input_dim} ({features.nnz} non-zeros)")
     
     # Initialize Model
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Training on {device}...")
+    model = MovieRecommenderNet(input_dim, EMBEDDING_DIM)
     
-    model = MovieRecommenderNet(input_dim, EMBEDDING_DIM).to(device)
-    criterion = nn.MSELoss()
-    optimizer = optim.Adam(model.parameters(), lr=0.001)
-    
-    # Training Loop
-    model.train()
-    for epoch in range(EPOCHS):
-        total_loss = 0
-        for batch in dataloader:
-            inputs = batch[0].to(device)
-            
-            optimizer.zero_grad()
-            reconstructed, _ = model(inputs)
-            loss = criterion(reconstructed, inputs)
-            loss.backward()
-            optimizer.step()
-            
-            total_loss += loss.item()
-            
-        print(f"Epoch {epoch+1}/{EPOCHS}, Loss: {total_loss/len(dataloader):.4f}")
+    # Training Loop (mini-batches are densified on the fly by DataLoader workers, see training.py)
+    config = config or TrainConfig()
+    if config.world_size > 1:
+        device = torch.device("cpu")
+    history = fit(model, features, config, device)
+    total_seconds = sum(epoch["seconds"] for epoch in history)
+    print(f"Trained {len(history)} epochs in {total_seconds:.1f}s")
+    model = model.to(device)
         
     # Save Artifacts
     if not os.path.exists(MODEL_DIR):
@@ -115,16 +118,6 @@ def train_model():
     print("Saving model and artifacts...")
     torch.save(model.state_dict(), os.path.join(MODEL_DIR, "model.pt"))
     
-    # Generate Embeddings for all movies
-    model.eval()
-    all_features_tensor = torch.FloatTensor(features).to(device)
-    _, embeddings = model(all_features_tensor)
-    embeddings_np = embeddings.cpu().detach().numpy()
-    
-    # Save Embeddings and Metadata
-    with open(os.path.join(MODEL_DIR, "embeddings.pkl"), "wb") as f:
-        pickle.dump(embeddings_np, f)
-        
     # Save Preprocessors
     print("Saving preprocessors...")
     with open(os.path.join(MODEL_DIR, "tfidf.pkl"), "wb") as f:
@@ -133,14 +126,56 @@ def train_model():
         pickle.dump(mlb, f)
     with open(os.path.join(MODEL_DIR, "scaler.pkl"), "wb") as f:
         pickle.dump(scaler, f)
-        
-    # Save Preprocessing objects for inference on new data (if needed)
-    # For this app, we mostly recommend from existing database, so we just need the IDs map
-    # But let's save the dataframe index map
-    df.reset_index(inplace=True)
-    df.to_pickle(os.path.join(MODEL_DIR, "movies_metadata.pkl"))
+    
+    # Generate Embeddings for all movies (encoder only, in chunks)
+    embeddings_np = embed_in_chunks(model, features, device)
+    
+    # Stage Embeddings and Metadata as a memory-mapped bundle (see artifacts.py).
+    # Everything else is written first and the bundle published last: the new
+    # manifest is what triggers a reload, so it must never see old indexes
+    catalog = Catalog.from_dataframe(df)
+    manifest, staged_dir = stage_bundle(MODEL_DIR, embeddings_np, catalog, content_hashes=catalog.content_hashes())
+
+    # Precompute each movie's nearest neighbours for fast /recommend lookups
+    print("Building neighbour table...")
+    save_neighbour_table(MODEL_DIR, build_neighbour_table(embeddings_np), version=manifest["version"])
+
+    # Indexes built from the old embeddings would serve wrong neighbours
+    ivf = rebuild_ivf_index(MODEL_DIR, embeddings_np, manifest["version"])
+    if ivf is not None:
+        print(f"Rebuilt IVF index ({ivf.nlist} lists)")
+    quantized = rebuild_quantized_index(MODEL_DIR, embeddings_np, manifest["version"])
+    if quantized is not None:
+        print(f"Rebuilt {quantized.kind} codes")
+
+    publish_bundle(MODEL_DIR, staged_dir)
+    print(f"Wrote artifact bundle {manifest['version']}")
     
     print("Training complete!")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the recommender and write serving artifacts")
+    parser.add_argument("--epochs", type=int, default=TrainConfig.epochs)
+    parser.add_argument("--batch-size", type=int, default=TrainConfig.batch_size)
+    parser.add_argument("--lr-scaling", choices=LR_SCALING, default=TrainConfig.lr_scaling)
+    parser.add_argument("--workers", type=int, default=TrainConfig.num_workers)
+    parser.add_argument("--prefetch", type=int, default=TrainConfig.prefetch_factor)
+    parser.add_argument("--threads", type=int, default=0, help="Intra-op threads (per process)")
+    parser.add_argument("--interop-threads", type=int, default=0)
+    parser.add_argument("--precision", choices=PRECISIONS, default=TrainConfig.precision)
+    parser.add_argument("--world-size", type=int, default=1, help="DDP processes over gloo (CPU)")
+    args = parser.parse_args()
+    return TrainConfig(
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        lr_scaling=args.lr_scaling,
+        num_workers=args.workers,
+        prefetch_factor=args.prefetch,
+        intra_op_threads=args.threads,
+        inter_op_threads=args.interop_threads,
+        precision=args.precision,
+        world_size=args.world_size,
+    )
+
 if __name__ == "__main__":
-    train_model()
+    train_model(parse_args())
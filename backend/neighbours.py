@@ -0,0 +1,141 @@
+import os
+import time
+
+import numpy as np
+
+from artifacts import StaleArtifactError, check_artifact_version, load_artifact_bundle
+from similarity import normalize_rows, top_k
+
+# Configuration
+MODEL_DIR = "backend/artifacts"
+NEIGHBOURS_FILENAME = "neighbours.npz"
+NUM_NEIGHBOURS = 50
+BLOCK_SIZE = 1024
+
+
+class NeighbourTable:
+    """Top-N neighbours of every catalog movie, computed offline.
+
+    Row i holds the ids (int32) and cosine scores (float16) of movie i's
+    nearest neighbours, best first and excluding i itself.
+    """
+
+    def __init__(self, ids, scores):
+        self.ids = ids
+        self.scores = scores
+
+    def __len__(self):
+        return self.ids.shape[0]
+
+    @property
+    def size(self):
+        return self.ids.shape[1]
+
+    def lookup(self, movie_id, k, mask=None):
+        # None when fewer than k stored neighbours qualify and a live search
+        # is needed
+        if k > self.size:
+            return None
+        ids = self.ids[movie_id]
+        scores = self.scores[movie_id]
+        if mask is not None:
+            keep = mask[ids]
+            if np.count_nonzero(keep) < k:
+                return None
+            ids = ids[keep]
+            scores = scores[keep]
+        return ids[:k].astype(np.int64), scores[:k].astype(np.float32)
+
+
+def build_neighbour_table(embeddings, n=NUM_NEIGHBOURS, block_size=BLOCK_SIZE):
+    # All-pairs top-N in row blocks: peak memory is block_size x rows scores,
+    # never the full rows x rows similarity matrix
+    vectors = normalize_rows(embeddings)
+    n = min(n, len(vectors) - 1)
+    ids = np.empty((len(vectors), n), dtype=np.int32)
+    scores = np.empty((len(vectors), n), dtype=np.float16)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size] @ vectors.T
+        rows = np.arange(len(block))
+        block[rows, start + rows] = -np.inf
+        best = top_k(block, n)
+        ids[start:start + len(block)] = best
+        scores[start:start + len(block)] = np.take_along_axis(block, best, axis=1)
+    return NeighbourTable(ids, scores)
+
+
+def update_neighbour_table(table, embeddings, updated_ids, block_size=BLOCK_SIZE):
+    """Refresh the table after rows were changed or appended.
+
+    Rows that were updated, or that list an updated row among their
+    neighbours (its stored score is stale), get a full scan. Every other row
+    only merges in its scores against the updated rows. Stored neighbours
+    are re-scored exactly for the merge (the table keeps float16), so the
+    result orders near-ties the same way a full rebuild does.
+    """
+    vectors = normalize_rows(embeddings)
+    n = table.size
+    updated = np.unique(np.asarray(updated_ids, dtype=np.int64))
+    stale = np.flatnonzero(np.isin(table.ids, updated).any(axis=1))
+    rescan = np.union1d(updated, stale)
+
+    ids = np.empty((len(vectors), n), dtype=np.int32)
+    scores = np.empty((len(vectors), n), dtype=np.float16)
+    ids[:len(table)] = table.ids
+    scores[:len(table)] = table.scores
+
+    # 1. Untouched rows: merge stored neighbours with the updated rows
+    keep = np.setdiff1d(np.arange(len(table)), rescan)
+    updated_vectors = vectors[updated]
+    for start in range(0, len(keep), block_size):
+        rows = keep[start:start + block_size]
+        fresh = vectors[rows] @ updated_vectors.T
+        stored = np.einsum("rd,rnd->rn", vectors[rows], vectors[ids[rows]])
+        candidate_ids = np.hstack([ids[rows], np.broadcast_to(updated, fresh.shape)])
+        candidate_scores = np.hstack([stored, fresh])
+        best = top_k(candidate_scores, n)
+        ids[rows] = np.take_along_axis(candidate_ids, best, axis=1)
+        scores[rows] = np.take_along_axis(candidate_scores, best, axis=1)
+
+    # 2. Updated and stale rows: full scan, as in build_neighbour_table
+    for start in range(0, len(rescan), block_size):
+        rows = rescan[start:start + block_size]
+        block = vectors[rows] @ vectors.T
+        block[np.arange(len(rows)), rows] = -np.inf
+        best = top_k(block, n)
+        ids[rows] = best
+        scores[rows] = np.take_along_axis(block, best, axis=1)
+    return NeighbourTable(ids, scores)
+
+
+def save_neighbour_table(model_dir, table, version=None):
+    # `version`: the bundle the embeddings came from, checked on load
+    np.savez(
+        os.path.join(model_dir, NEIGHBOURS_FILENAME),
+        version=np.array(version or ""),
+        ids=table.ids,
+        scores=table.scores,
+    )
+
+
+def load_neighbour_table(model_dir, version=None):
+    # None when no table has been built, or it was built for another bundle
+    path = os.path.join(model_dir, NEIGHBOURS_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        try:
+            check_artifact_version("Neighbour table", str(data["version"]) if "version" in data else None, version)
+        except StaleArtifactError as e:
+            print(f"Ignoring stale table: {e}; rebuild with python backend/neighbours.py")
+            return None
+        return NeighbourTable(data["ids"], data["scores"])
+
+
+if __name__ == "__main__":
+    # Rebuild the table from existing embeddings without retraining
+    bundle = load_artifact_bundle(MODEL_DIR, verify=False)
+    start = time.perf_counter()
+    table = build_neighbour_table(bundle.embeddings)
+    save_neighbour_table(MODEL_DIR, table, version=bundle.version)
+    print(f"Saved top-{table.size} neighbours for {len(table)} movies in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,391 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from artifacts import StaleArtifactError, check_artifact_version, load_artifact_bundle
+from similarity import MASK_GATHER_FRACTION, SimilarityIndex, normalize_rows, top_k
+
+# Configuration
+MODEL_DIR = "backend/artifacts"
+QUANTIZED_FILENAME = "quantized.npz"
+CODECS = ("float16", "int8", "pq")
+RERANK_FACTOR = 8 # Candidates re-scored exactly per requested result
+PQ_SUBSPACES = 8 # 64 dims -> 8 sub-vectors of 8 dims, one byte each
+PQ_CENTROIDS = 256
+PQ_ITERATIONS = 20
+PQ_SAMPLE_SIZE = 100_000 # Rows used to train the codebooks
+SCAN_CHUNK_SIZE = 65_536 # Rows decoded at a time during a scan
+
+
+class Float16Codec:
+    """Half-precision copy of the normalized vectors (2 bytes per dim)."""
+
+    kind = "float16"
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float16)
+
+    def scores(self, queries, codes):
+        # numpy's float16 matmul is unvectorized; torch runs it natively
+        import torch
+
+        with torch.inference_mode():
+            scores = torch.from_numpy(np.ascontiguousarray(queries, dtype=np.float16)) @ torch.from_numpy(codes).T
+        return scores.float().numpy()
+
+    def params(self):
+        return {}
+
+    @classmethod
+    def from_params(cls, params):
+        return cls()
+
+
+class ScalarCodec:
+    """int8 scalar quantization: each dim mapped linearly onto 0..255.
+
+    A row decodes as low + codes * scale, so a query scores it as
+    (query * scale) . codes + query . low without decoding.
+    """
+
+    kind = "int8"
+
+    def __init__(self, low, scale):
+        self.low = low.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @classmethod
+    def train(cls, vectors):
+        low = vectors.min(axis=0)
+        high = vectors.max(axis=0)
+        scale = np.maximum(high - low, 1e-12) / 255
+        return cls(low, scale)
+
+    def encode(self, vectors):
+        codes = np.rint((np.asarray(vectors, dtype=np.float32) - self.low) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def scores(self, queries, codes):
+        scaled = queries * self.scale
+        offset = queries @ self.low
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK_SIZE):
+            chunk = codes[start:start + SCAN_CHUNK_SIZE].astype(np.float32)
+            out[:, start:start + len(chunk)] = scaled @ chunk.T + offset[:, None]
+        return out
+
+    def params(self):
+        return {"low": self.low, "scale": self.scale}
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(params["low"], params["scale"])
+
+
+def kmeans(vectors, n_clusters, n_iter=PQ_ITERATIONS, seed=0):
+    # Euclidean k-means (PQ sub-vectors are not normalized)
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = nearest_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        empty = counts == 0
+        centroids = sums / np.maximum(counts, 1)[:, None]
+        if empty.any():
+            centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+    return centroids.astype(np.float32)
+
+
+def nearest_centroids(vectors, centroids):
+    # argmin ||x - c||^2 = argmax (x . c - ||c||^2 / 2), chunked
+    half_norms = 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), SCAN_CHUNK_SIZE):
+        chunk = vectors[start:start + SCAN_CHUNK_SIZE]
+        out[start:start + len(chunk)] = np.argmax(chunk @ centroids.T - half_norms, axis=1)
+    return out
+
+
+class ProductCodec:
+    """Product quantization with asymmetric distance computation.
+
+    Each vector is split into `m` sub-vectors, each replaced by the id of its
+    nearest codebook centroid (one byte for 256 centroids). A query builds a
+    table of its inner product with every centroid of every subspace; a row's
+    approximate score is then the sum of `m` table lookups.
+    """
+
+    kind = "pq"
+
+    def __init__(self, codebooks):
+        self.codebooks = codebooks.astype(np.float32) # (m, n_centroids, sub_dim)
+
+    @classmethod
+    def train(cls, vectors, m=PQ_SUBSPACES, n_centroids=PQ_CENTROIDS, seed=0):
+        dim = vectors.shape[1]
+        if dim % m:
+            raise ValueError(f"{dim} dims do not split into {m} subspaces")
+        rng = np.random.default_rng(seed)
+        sample = vectors
+        if len(vectors) > PQ_SAMPLE_SIZE:
+            sample = vectors[rng.choice(len(vectors), PQ_SAMPLE_SIZE, replace=False)]
+        sample = np.asarray(sample, dtype=np.float32).reshape(len(sample), m, dim // m)
+        return cls(np.stack([kmeans(sample[:, i], n_centroids, seed=seed + i) for i in range(m)]))
+
+    @property
+    def m(self):
+        return self.codebooks.shape[0]
+
+    def encode(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), self.m, -1)
+        codes = np.empty((len(vectors), self.m), dtype=np.uint8)
+        for i in range(self.m):
+            codes[:, i] = nearest_centroids(np.ascontiguousarray(vectors[:, i]), self.codebooks[i])
+        return codes
+
+    def scores(self, queries, codes):
+        tables = np.einsum("qmd,mcd->qmc", queries.reshape(len(queries), self.m, -1), self.codebooks)
+        out = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_CHUNK_SIZE):
+            chunk = codes[start:start + SCAN_CHUNK_SIZE]
+            total = np.zeros((len(queries), len(chunk)), dtype=np.float32)
+            for i in range(self.m):
+                total += tables[:, i, chunk[:, i]]
+            out[:, start:start + len(chunk)] = total
+        return out
+
+    def params(self):
+        return {"codebooks": self.codebooks}
+
+    @classmethod
+    def from_params(cls, params):
+        return cls(params["codebooks"])
+
+
+def train_codec(kind, vectors, seed=0):
+    if kind == "float16":
+        return Float16Codec()
+    if kind == "int8":
+        return ScalarCodec.train(vectors)
+    if kind == "pq":
+        return ProductCodec.train(vectors, seed=seed)
+    raise ValueError(f"Unknown codec '{kind}', expected one of {CODECS}")
+
+
+CODEC_CLASSES = {codec.kind: codec for codec in (Float16Codec, ScalarCodec, ProductCodec)}
+
+
+class QuantizedIndex:
+    """Approximate scan over compressed codes, then exact re-ranking.
+
+    Every query scores all (masked) rows from the codes, keeps the best
+    k * `rerank_factor` candidates and re-scores only those against the full
+    precision vectors. `vectors` is normally the bundle mmap, so apart from
+    the codes only the candidate rows' pages are ever read.
+    """
+
+    def __init__(self, codec, codes, vectors, rerank_factor=RERANK_FACTOR):
+        self.codec = codec
+        self.codes = codes
+        self.vectors = vectors
+        self.rerank_factor = rerank_factor
+
+    @classmethod
+    def build(cls, vectors, kind, rerank_factor=RERANK_FACTOR, seed=0):
+        vectors = normalize_rows(vectors)
+        codec = train_codec(kind, vectors, seed=seed)
+        return cls(codec, codec.encode(vectors), vectors, rerank_factor=rerank_factor)
+
+    @property
+    def kind(self):
+        return self.codec.kind
+
+    @property
+    def nbytes(self):
+        # Codes plus codec parameters: what stays resident per process
+        return self.codes.nbytes + sum(np.asarray(p).nbytes for p in self.codec.params().values())
+
+    def save(self, path, version=None):
+        # `version`: the bundle the vectors came from, checked on load
+        np.savez(
+            path,
+            version=np.array(version or ""),
+            kind=np.array(self.kind),
+            codes=self.codes,
+            rerank_factor=np.int64(self.rerank_factor),
+            **self.codec.params(),
+        )
+
+    @classmethod
+    def load(cls, path, vectors, version=None):
+        # `vectors` must be the same normalized matrix the codes were built
+        # from; with `version`, codes built for another bundle are rejected
+        with np.load(path) as data:
+            check_artifact_version("Quantized index", str(data["version"]) if "version" in data else None, version)
+            kind = str(data["kind"])
+            codec = CODEC_CLASSES[kind].from_params(data)
+            index = cls(codec, data["codes"], vectors, rerank_factor=int(data["rerank_factor"]))
+        if len(index.codes) != len(vectors):
+            raise ValueError(f"Quantized index covers {len(index.codes)} rows but embeddings have {len(vectors)}")
+        return index
+
+    def approximate(self, queries, k, exclude=None, mask=None):
+        # Top-k ids by approximate score (no re-ranking), one array per query
+        ids = None
+        if mask is not None and np.count_nonzero(mask) < MASK_GATHER_FRACTION * len(self.codes):
+            ids = np.flatnonzero(mask)
+            scores = self.codec.scores(queries, self.codes[ids])
+        else:
+            scores = self.codec.scores(queries, self.codes)
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+        if exclude is not None:
+            for row, excluded in enumerate(exclude):
+                if excluded is None:
+                    continue
+                excluded = np.asarray(excluded, dtype=np.int64)
+                if ids is not None:
+                    positions = np.searchsorted(ids, excluded)
+                    found = positions < len(ids)
+                    found[found] = ids[positions[found]] == excluded[found]
+                    excluded = positions[found]
+                scores[row, excluded] = -np.inf
+        best = top_k(scores, k)
+        results = []
+        for row in range(len(queries)):
+            keep = best[row][np.isfinite(scores[row, best[row]])]
+            results.append(keep if ids is None else ids[keep])
+        return results
+
+    def search_batch(self, queries, k, exclude=None, mask=None):
+        queries = normalize_rows(queries)
+        candidates = self.approximate(queries, k * self.rerank_factor, exclude=exclude, mask=mask)
+
+        all_indices = []
+        all_scores = []
+        for query, ids in zip(queries, candidates):
+            # Sorted ids read the mmap in file order
+            ids = np.sort(ids)
+            scores = np.asarray(self.vectors[ids], dtype=np.float32) @ query
+            best = top_k(scores, k)
+            all_indices.append(ids[best].astype(np.int64))
+            all_scores.append(scores[best].astype(np.float32))
+        # One array per query (see SimilarityIndex.search_batch)
+        return all_indices, all_scores
+
+
+def load_quantized_index(model_dir, vectors, version=None):
+    # Returns None when no codes have been built, or they are stale
+    path = os.path.join(model_dir, QUANTIZED_FILENAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        return QuantizedIndex.load(path, vectors, version=version)
+    except StaleArtifactError as e:
+        print(f"Ignoring stale index: {e}; rebuild with python backend/quantization.py build")
+        return None
+
+
+def rebuild_quantized_index(model_dir, vectors, version):
+    """Retrain existing codes for new vectors (e.g. after a retrain).
+
+    Keeps their codec and re-rank factor; does nothing when none were built.
+    """
+    path = os.path.join(model_dir, QUANTIZED_FILENAME)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        kind, rerank_factor = str(data["kind"]), int(data["rerank_factor"])
+    index = QuantizedIndex.build(vectors, kind, rerank_factor=rerank_factor)
+    index.save(path, version=version)
+    return index
+
+
+def compression_report(vectors, kinds=CODECS, k=10, n_queries=500, rerank_factors=(1, 4, RERANK_FACTOR), seed=0):
+    """Memory, tie-aware recall@k and score loss of each codec vs exact search.
+
+    A re-rank factor of 1 is the codes alone (no exact re-scoring). Score
+    loss is the mean drop in exact similarity of the returned neighbours;
+    catalogs with many near-duplicate embeddings show low recall but a
+    negligible loss, because the misses are as similar as the true hits.
+    """
+    vectors = normalize_rows(vectors)
+    exact = SimilarityIndex(vectors, normalized=True)
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(vectors), min(n_queries, len(vectors)), replace=False)
+    queries = vectors[query_ids]
+    exclude = [[i] for i in query_ids]
+
+    start = time.perf_counter()
+    truth = [exact.search_by_id(i, k)[1] for i in query_ids]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(query_ids)
+
+    rows = []
+    for kind in kinds:
+        start = time.perf_counter()
+        index = QuantizedIndex.build(vectors, kind, seed=seed)
+        build_seconds = time.perf_counter() - start
+        for factor in rerank_factors:
+            index.rerank_factor = factor
+            start = time.perf_counter()
+            results = [index.search_batch(q[None, :], k, exclude=[e])[0][0] for q, e in zip(queries, exclude)]
+            latency_ms = (time.perf_counter() - start) * 1000 / len(query_ids)
+            hits = 0
+            loss = 0.0
+            for query, found, expected in zip(queries, results, truth):
+                # Judge by exact scores so tied neighbours count as hits
+                found_scores = vectors[found] @ query
+                hits += int(np.sum(found_scores >= expected[-1] - 1e-6))
+                loss += float(expected.mean() - found_scores.mean())
+            rows.append({
+                "codec": kind,
+                "rerank_factor": factor,
+                "bytes": index.nbytes,
+                "compression": vectors.nbytes / index.nbytes,
+                "recall": hits / (k * len(query_ids)),
+                "score_loss": loss / len(query_ids),
+                "latency_ms": latency_ms,
+                "exact_latency_ms": exact_ms,
+                "build_seconds": build_seconds,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and evaluate compressed embedding indexes")
+    parser.add_argument("command", choices=["build", "report"])
+    parser.add_argument("--codec", choices=CODECS, default="pq")
+    parser.add_argument("--rerank-factor", type=int, default=RERANK_FACTOR)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    bundle = load_artifact_bundle(MODEL_DIR, verify=False)
+    vectors = normalize_rows(bundle.embeddings)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = QuantizedIndex.build(vectors, args.codec, rerank_factor=args.rerank_factor)
+        index.save(os.path.join(MODEL_DIR, QUANTIZED_FILENAME), version=bundle.version)
+        print(
+            f"Built {index.kind} codes in {time.perf_counter() - start:.1f}s: "
+            f"{index.nbytes / 2**20:.1f} MB vs {vectors.nbytes / 2**20:.1f} MB float32"
+        )
+        return
+
+    print(f"{len(vectors)} rows x {vectors.shape[1]} dims, float32 {vectors.nbytes / 2**20:.1f} MB, k={args.k}")
+    print(f"{'codec':>8} {'rerank':>6} {'MB':>7} {'ratio':>6} {'recall@k':>9} {'loss':>9} {'ms':>7} {'exact ms':>9}")
+    for row in compression_report(vectors, k=args.k, n_queries=args.queries):
+        print(
+            f"{row['codec']:>8} {row['rerank_factor']:>6} {row['bytes'] / 2**20:>7.2f} {row['compression']:>6.1f}"
+            f" {row['recall']:>9.3f} {row['score_loss']:>9.2e} {row['latency_ms']:>7.3f} {row['exact_latency_ms']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+
+from serialization import dumps
+
+# Configuration
+LOG_SAMPLE_RATE = 0.01 # Share of ordinary requests logged
+LOG_SLOW_SECONDS = 0.25 # Requests slower than this are always logged
+LOG_QUEUE_SIZE = 10000 # Records waiting for the writer thread; extra records are dropped
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Never block the event loop: when the writer falls behind, drop the record
+
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Formatting is left to the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _JSONFormatter(logging.Formatter):
+    def format(self, record):
+        return dumps({"ts": round(record.created, 3), **record.msg}).decode("utf-8")
+
+
+class RequestLog:
+    """Structured, sampled request log written by a background thread.
+
+    Each record is one JSON line (method, route, status, duration and the
+    per-stage timings). Errors and slow requests are always kept, everything
+    else with probability `sample_rate`. Handlers only enqueue the record;
+    formatting and the write happen on the listener thread.
+    """
+
+    def __init__(self, stream=None, sample_rate=LOG_SAMPLE_RATE, slow_seconds=LOG_SLOW_SECONDS,
+                 queue_size=LOG_QUEUE_SIZE):
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._handler = _DroppingQueueHandler(self._queue)
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(_JSONFormatter())
+        self._listener = logging.handlers.QueueListener(self._queue, output)
+        self._logger = logging.getLogger("recommender.requests")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(self._handler)
+        self._running = False
+
+    @property
+    def dropped(self):
+        return self._handler.dropped
+
+    def start(self):
+        if not self._running:
+            self._listener.start()
+            self._running = True
+
+    def stop(self):
+        # Flushes everything already queued
+        if self._running:
+            self._listener.stop()
+            self._running = False
+
+    def should_log(self, status, seconds):
+        return status >= 500 or seconds >= self.slow_seconds or random.random() < self.sample_rate
+
+    def log(self, status, seconds, **fields):
+        if not self.should_log(status, seconds):
+            return
+        level = logging.ERROR if status >= 500 else logging.INFO
+        self._logger.log(level, {"status": status, "duration_ms": round(seconds * 1000, 3), **fields})
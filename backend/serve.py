@@ -0,0 +1,220 @@
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+# Configuration
+HOST = "0.0.0.0"
+PORT = 8000
+WORKERS = os.cpu_count() or 1
+BACKLOG = 2048
+RESPAWN_DELAY_SECONDS = 1.0 # Pause before replacing a worker that died
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve the API from several preloaded worker processes")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--threads", type=int, default=0, help="torch/BLAS threads per worker (default: cores / workers)")
+    parser.add_argument("--compute-threads", type=int, default=None, help="Handler offload pool size per worker")
+    parser.add_argument("--pin-cpus", action="store_true", help="Pin each worker to its own slice of the cores")
+    parser.add_argument("--log-level", default="warning")
+    return parser.parse_args()
+
+
+def worker_cpus(index, threads):
+    # Disjoint slice of the usable cores for worker `index` (wraps around if
+    # there are more threads in total than cores)
+    cpus = sorted(os.sched_getaffinity(0))
+    return {cpus[(index * threads + i) % len(cpus)] for i in range(threads)}
+
+
+def limit_threads(threads):
+    import torch
+
+    torch.set_num_threads(threads)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError: # Optional: the environment variables set at startup still apply
+        return
+    threadpool_limits(threads)
+
+
+def run_worker(index, sock, args, threads):
+    import uvicorn
+
+    import main
+
+    if args.pin_cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, worker_cpus(index, threads))
+    limit_threads(threads)
+    config = uvicorn.Config(main.app, log_level=args.log_level, access_log=False)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    """Preload the artifacts once, then fork uvicorn workers sharing them.
+
+    Workers inherit the ServingState (the memory-mapped bundle and the
+    copy-on-write pages built from it) and accept on one listening socket.
+    Each worker's torch/BLAS pools are limited to its share of the cores,
+    and a worker that dies is replaced.
+
+    Reloads happen here too: on SIGHUP (sent by POST /admin/reload in any
+    worker) or when ARTIFACT_WATCH_SECONDS sees new files, this process
+    loads the new state once and replaces every worker, so they all switch
+    versions and keep sharing pages. Reloading inside a worker would update
+    only that one and give it a private copy.
+    """
+    args = parse_args()
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    threads = args.threads or max(1, cores // args.workers)
+
+    # 1. Thread pools read these when torch/numpy first load, so set them
+    # before either is imported (the preload below loads both)
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    if args.compute_threads is not None:
+        os.environ["COMPUTE_THREADS"] = str(args.compute_threads)
+    elif "COMPUTE_THREADS" not in os.environ:
+        os.environ["COMPUTE_THREADS"] = str(threads)
+
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    import main as app_module
+    from state import artifact_fingerprint
+
+    # 2. Preload the artifacts in the parent; workers inherit the state and
+    # skip loading in their startup handler
+    start = time.perf_counter()
+    state = app_module.state_manager.loader()
+    app_module.state_manager.current = state
+    print(f"Preloaded artifacts {state.version} in {time.perf_counter() - start:.1f}s")
+    # Workers hand reloads to this process and do not watch the files themselves
+    app_module.SUPERVISOR_PID = os.getpid()
+    watch_seconds = app_module.ARTIFACT_WATCH_SECONDS
+    app_module.ARTIFACT_WATCH_SECONDS = 0
+
+    # 3. One listening socket shared by every worker
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(BACKLOG)
+    sock.set_inheritable(True)
+
+    # 4. Fork the workers and keep them running until told to stop
+    children = {}
+    stopping = False
+    reloading = False
+
+    def spawn(index):
+        sys.stdout.flush() # Or buffered output is written again by the child
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGALRM, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(index, sock, args, threads)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reload():
+        # Load the new state, then fork fresh workers from it and let the old
+        # ones finish their requests and exit. A failed load keeps them all
+        previous = app_module.state_manager.current
+        start = time.perf_counter()
+        try:
+            state = app_module.state_manager.loader()
+        except Exception as e:
+            print(f"Artifact reload failed, still serving {previous.version}: {e}")
+            return False
+        app_module.state_manager.current = state
+        print(f"Loaded artifacts {state.version} in {time.perf_counter() - start:.1f}s, replacing workers")
+        for pid, index in list(children.items()):
+            # Dropped from children first, so its exit is not taken for a crash
+            del children[pid]
+            spawn(index)
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        return True
+
+    def guarded_reload():
+        # A signal can arrive while a reload is already running in a handler
+        nonlocal reloading
+        if stopping or reloading:
+            return True
+        reloading = True
+        try:
+            return reload()
+        finally:
+            reloading = False
+
+    def on_reload_signal(signum, frame):
+        guarded_reload()
+
+    # Same rule as StateManager._watch: reload once the files differ from the
+    # served state and have stopped changing for a full interval
+    seen = None
+    failed = None
+
+    def on_watch_tick(signum, frame):
+        nonlocal seen, failed
+        fingerprint = artifact_fingerprint(app_module.MODEL_DIR)
+        changed = fingerprint != app_module.state_manager.current.fingerprint
+        if changed and fingerprint == seen and fingerprint != failed:
+            if not guarded_reload():
+                failed = fingerprint
+        seen = fingerprint
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGHUP, on_reload_signal)
+    if watch_seconds > 0:
+        signal.signal(signal.SIGALRM, on_watch_tick)
+        signal.setitimer(signal.ITIMER_REAL, watch_seconds, watch_seconds)
+    for index in range(args.workers):
+        spawn(index)
+    print(
+        f"Serving on http://{args.host}:{args.port} with {args.workers} workers x {threads} threads"
+        f" ({os.environ['COMPUTE_THREADS']} compute threads each)"
+    )
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is not None and not stopping:
+            print(f"Worker {index} (pid {pid}) exited with status {status}, restarting")
+            time.sleep(RESPAWN_DELAY_SECONDS)
+            spawn(index)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
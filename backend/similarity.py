@@ -0,0 +1,139 @@
+import numpy as np
+
+# Masks selecting fewer than this share of rows are scanned by gathering
+# just those rows instead of scoring everything and discarding the rest
+MASK_GATHER_FRACTION = 0.25
+
+
+def normalize_rows(vectors):
+    # L2-normalize each row, leaving all-zero rows as zeros
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms, dtype=np.float32)
+
+
+def top_k(scores, k):
+    """Indices of the k highest scores along the last axis, best first.
+
+    Uses argpartition (O(n)) and only sorts the k survivors.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        candidates = np.broadcast_to(np.arange(n), scores.shape).copy()
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1)
+
+
+def exact_search(vectors, queries, k, exclude=None, mask=None):
+    """Brute-force top-k of normalized `queries` against normalized `vectors`.
+
+    `exclude` holds per-query row ids that must not be returned; `mask` is a
+    boolean row mask shared by all queries. Both are applied before the
+    top-k selection, so each query gets k results whenever k rows qualify
+    for it. Returns per-query (ids, scores) arrays, which can be shorter
+    than k (and differ in length) when exclusions or the mask leave fewer.
+    """
+    ids = None
+    if mask is not None and np.count_nonzero(mask) < MASK_GATHER_FRACTION * len(vectors):
+        ids = np.flatnonzero(mask)
+        scores = queries @ vectors[ids].T
+    else:
+        scores = queries @ vectors.T
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+    if exclude is not None:
+        for row, excluded in enumerate(exclude):
+            if excluded is None:
+                continue
+            excluded = np.asarray(excluded, dtype=np.int64)
+            if ids is not None:
+                # Row ids -> positions among the gathered rows
+                positions = np.searchsorted(ids, excluded)
+                found = positions < len(ids)
+                found[found] = ids[positions[found]] == excluded[found]
+                excluded = positions[found]
+            scores[row, excluded] = -np.inf
+    best = top_k(scores, k)
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    if ids is not None:
+        best = ids[best]
+    if exclude is None and mask is None:
+        return list(best), list(best_scores)
+    # Drop each query's excluded / masked-out rows that filled its top-k
+    found = np.isfinite(best_scores)
+    return [b[f] for b, f in zip(best, found)], [s[f] for s, f in zip(best_scores, found)]
+
+
+class SimilarityIndex:
+    """Exact cosine-similarity search over a fixed embedding matrix.
+
+    The embeddings are normalized once when the index is built, so a query
+    costs one matrix-vector product plus an O(n) top-k selection. When an
+    approximate index (see ann_index.py) is attached as `ann`, searches go
+    through it instead. A precomputed NeighbourTable attached as `neighbours`
+    answers catalog-movie queries for k up to its size without any scan.
+    """
+
+    def __init__(self, embeddings, ann=None, neighbours=None, normalized=False):
+        # Already-normalized float32 input (e.g. a bundle mmap) is used as-is,
+        # so worker processes share its pages instead of each holding a copy
+        if normalized:
+            self.vectors = np.asarray(embeddings, dtype=np.float32)
+        else:
+            self.vectors = normalize_rows(embeddings)
+        self.ann = ann
+        self.neighbours = neighbours
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    def search(self, query, k, exclude=None, mask=None):
+        # Returns (indices, scores) for one query vector, best first.
+        # A zero query has no direction, so it matches nothing.
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        if not np.any(query):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        indices, scores = self.search_batch(
+            query[None, :], k, exclude=None if exclude is None else [exclude], mask=mask
+        )
+        return indices[0], scores[0]
+
+    def search_batch(self, queries, k, exclude=None, mask=None):
+        """Top-k for many queries at once with a single matrix product.
+
+        `exclude` is an optional per-query sequence of row ids (or None) that
+        must not appear in that query's results, e.g. the seed movie itself.
+        `mask` is an optional boolean row mask (see filters.py) restricting
+        all queries to the rows where it is True.
+        Returns (indices, scores): one array per query, best first, with k
+        entries whenever k rows qualify for that query.
+        """
+        if self.ann is not None:
+            return self.ann.search_batch(queries, k, exclude=exclude, mask=mask)
+        return exact_search(self.vectors, normalize_rows(queries), k, exclude=exclude, mask=mask)
+
+    def precomputed(self, movie_id, k, mask=None):
+        # search_by_id answered from the neighbour table (no scan), or None
+        if self.neighbours is None or not np.any(self.vectors[movie_id]):
+            return None
+        return self.neighbours.lookup(movie_id, k, mask=mask)
+
+    def search_by_id(self, movie_id, k, mask=None):
+        # Neighbours of a catalog movie, excluding the movie itself
+        result = self.precomputed(movie_id, k, mask=mask)
+        if result is not None:
+            return result
+        return self.search(self.vectors[movie_id], k, exclude=[movie_id], mask=mask)
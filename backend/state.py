@@ -0,0 +1,325 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from ann_index import IVF_FILENAME, load_ivf_index
+from artifacts import BUNDLE_DIRNAME, MANIFEST_FILENAME, load_artifact_bundle, verify_model_files
+from catalog import Catalog
+from filters import FilterIndex
+from neighbours import NEIGHBOURS_FILENAME, load_neighbour_table
+from quantization import QUANTIZED_FILENAME, load_quantized_index
+from serialization import EncodedCatalog
+from similarity import SimilarityIndex
+from title_index import TitleIndex
+
+# Every file whose change should trigger a reload
+WATCHED_FILES = (
+    os.path.join(BUNDLE_DIRNAME, MANIFEST_FILENAME),
+    "movies_metadata.pkl",
+    "embeddings.pkl",
+    "model.pt",
+    "tfidf.pkl",
+    "mlb.pkl",
+    "scaler.pkl",
+    NEIGHBOURS_FILENAME,
+    IVF_FILENAME,
+    QUANTIZED_FILENAME,
+)
+
+
+class StartupTimer:
+    """Wall-clock seconds of each named startup stage, in load order."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = time.perf_counter() - start
+
+    def summary(self, names=None):
+        names = names or self.seconds
+        return ", ".join(f"{name} {self.seconds[name]:.2f}s" for name in names if name in self.seconds)
+
+
+class ModelUnavailable(RuntimeError):
+    """The plot-query model failed to load; catalog endpoints are unaffected."""
+
+
+@dataclass(frozen=True)
+class ModelComponents:
+    featurizer: object
+    encoder: object
+    lexical: object
+    input_dim: int
+
+
+class LazyModel:
+    """Everything only plot queries need, loaded on first use.
+
+    The sklearn preprocessors, the BM25 index built with their analyzer, and
+    the torch encoder. torch and sklearn are imported here rather than at
+    startup, so the catalog endpoints serve without waiting for them.
+    `load` is thread-safe and loads once; concurrent callers wait for that
+    load, and a failed load is retried by the next caller.
+    """
+
+    def __init__(
+        self, model_dir, catalog, embedding_dim, encoder_mode="eager", device=None, timer=None,
+        model_files=None, verify=True,
+    ):
+        self.model_dir = model_dir
+        self.catalog = catalog
+        self.embedding_dim = embedding_dim
+        self.encoder_mode = encoder_mode
+        self.device = device
+        self.timer = timer or StartupTimer()
+        # Manifest record of model.pt and the pickles, checked before reading
+        # them so a lazy load never pairs a retrained model with old artifacts
+        self.model_files = model_files
+        self.verify = verify
+        self.error = None
+        self._components = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._components is not None
+
+    def load(self):
+        components = self._components
+        if components is not None:
+            return components
+        with self._lock:
+            if self._components is None:
+                start = time.perf_counter()
+                try:
+                    self._components = self._load()
+                except Exception as e:
+                    self.error = str(e)
+                    raise ModelUnavailable(f"Model failed to load: {e}") from e
+                self.error = None
+                self.timer.seconds["model_total"] = time.perf_counter() - start
+                print(f"Model loaded in {self.timer.seconds['model_total']:.2f}s ({self.timer.summary(MODEL_STAGES)})")
+        return self._components
+
+    def _load(self):
+        timer = self.timer
+        with timer.stage("model_imports"):
+            import torch
+
+            from features import Featurizer
+            from inference import EncoderInference
+            from lexical import LexicalIndex
+
+        # Load Preprocessors
+        with timer.stage("preprocessors"):
+            verify_model_files(self.model_dir, self.model_files, checksums=self.verify)
+            featurizer = Featurizer.load(self.model_dir)
+        # BM25 postings over title + overview, tokenized like the TF-IDF features
+        with timer.stage("lexical_index"):
+            lexical = LexicalIndex.from_catalog(self.catalog, featurizer.tfidf)
+
+        # Load Model (encoder only; the decoder is never needed for serving)
+        with timer.stage("encoder"):
+            device = torch.device(self.device or ("cuda" if torch.cuda.is_available() else "cpu"))
+            state_dict = torch.load(os.path.join(self.model_dir, "model.pt"), map_location=device)
+            input_dim = state_dict["encoder.0.weight"].shape[1]
+            if featurizer.input_dim != input_dim:
+                raise ValueError(f"Preprocessors produce {featurizer.input_dim} features, model expects {input_dim}")
+            embedding_dim = state_dict["encoder.4.weight"].shape[0]
+            if embedding_dim != self.embedding_dim:
+                raise ValueError(f"Model embeds to {embedding_dim} dims, catalog embeddings have {self.embedding_dim}")
+            encoder = EncoderInference(state_dict, mode=self.encoder_mode, device=device)
+        return ModelComponents(featurizer, encoder, lexical, input_dim)
+
+
+CORE_STAGES = ("bundle", "title_index", "encoded_catalog", "similarity_index", "neighbours", "filters")
+MODEL_STAGES = ("model_imports", "preprocessors", "lexical_index", "encoder")
+
+
+@dataclass(frozen=True)
+class ServingState:
+    """Everything a request reads, loaded and validated together.
+
+    Never mutated after construction: a reload builds a new ServingState and
+    swaps the reference, so in-flight requests finish on the one they started
+    with. The plot-query model is a LazyModel; reading `featurizer`,
+    `encoder`, `lexical` or `input_dim` loads it if needed.
+    """
+
+    version: str
+    fingerprint: str
+    catalog: Catalog
+    encoded: EncodedCatalog
+    embeddings: object
+    similarity_index: SimilarityIndex
+    title_index: TitleIndex
+    filters: FilterIndex
+    model: LazyModel
+    startup_seconds: dict # Per-stage load times (see StartupTimer), model stages once loaded
+
+    @property
+    def featurizer(self):
+        return self.model.load().featurizer
+
+    @property
+    def encoder(self):
+        return self.model.load().encoder
+
+    @property
+    def lexical(self):
+        return self.model.load().lexical
+
+    @property
+    def input_dim(self):
+        return self.model.load().input_dim
+
+
+def artifact_fingerprint(model_dir):
+    # Cheap change detection from file sizes and modification times
+    digest = hashlib.sha256()
+    for name in WATCHED_FILES:
+        path = os.path.join(model_dir, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_state(model_dir, verify=True, encoder_mode="eager", device=None, load_model=True):
+    """Load and validate a ServingState; raises on any mismatch.
+
+    The catalog, embeddings and their indexes load first. With
+    load_model=False the plot-query model is left to load on first use (or
+    by calling state.model.load()), so catalog endpoints can serve sooner;
+    otherwise it is loaded and validated here too.
+    """
+    fingerprint = artifact_fingerprint(model_dir)
+    timer = StartupTimer()
+    start = time.perf_counter()
+
+    # Load Embeddings + Metadata (memory-mapped bundle, or legacy pickles)
+    with timer.stage("bundle"):
+        bundle = load_artifact_bundle(model_dir, verify=verify)
+        catalog = bundle.catalog
+    print(f"Artifact version {bundle.version} ({len(catalog)} movies)")
+    with timer.stage("title_index"):
+        title_index = TitleIndex(catalog.title.tolist())
+    # Movie JSON for every row, encoded once so responses are byte joins
+    with timer.stage("encoded_catalog"):
+        encoded = EncodedCatalog(catalog)
+    with timer.stage("similarity_index"):
+        similarity_index = SimilarityIndex(bundle.embeddings, normalized=bundle.normalized)
+        # Optional ANN index (python backend/ann_index.py build); exact search otherwise
+        similarity_index.ann = load_ivf_index(model_dir, similarity_index.vectors, version=bundle.version)
+        if similarity_index.ann is not None:
+            print(f"Using IVF index ({similarity_index.ann.nlist} lists, nprobe={similarity_index.ann.nprobe})")
+        else:
+            # Or compressed codes with exact re-ranking (python backend/quantization.py build)
+            similarity_index.ann = load_quantized_index(model_dir, similarity_index.vectors, version=bundle.version)
+            if similarity_index.ann is not None:
+                print(f"Using {similarity_index.ann.kind} codes (re-rank x{similarity_index.ann.rerank_factor})")
+    # Precomputed neighbours answer /recommend for k up to the table size
+    with timer.stage("neighbours"):
+        neighbours = load_neighbour_table(model_dir, version=bundle.version)
+        if neighbours is not None and len(neighbours) == len(similarity_index):
+            similarity_index.neighbours = neighbours
+            print(f"Using precomputed top-{neighbours.size} neighbour table")
+    # Industry / genre / year masks for filtered search
+    with timer.stage("filters"):
+        filters = FilterIndex(catalog)
+    timer.seconds["core_total"] = time.perf_counter() - start
+    print(f"Catalog state ready in {timer.seconds['core_total']:.2f}s ({timer.summary(CORE_STAGES)})")
+
+    model = LazyModel(
+        model_dir, catalog, similarity_index.dim, encoder_mode=encoder_mode, device=device, timer=timer,
+        model_files=bundle.manifest.get("model_files"), verify=verify,
+    )
+    if load_model:
+        model.load()
+
+    return ServingState(
+        version=bundle.version,
+        fingerprint=fingerprint,
+        catalog=catalog,
+        encoded=encoded,
+        embeddings=bundle.embeddings,
+        similarity_index=similarity_index,
+        title_index=title_index,
+        filters=filters,
+        model=model,
+        startup_seconds=timer.seconds,
+    )
+
+
+class StateManager:
+    """Holds the current ServingState and replaces it atomically.
+
+    `reload` builds the next state in a worker thread while requests keep
+    using the current one; only a fully validated state is swapped in. A
+    failed reload keeps serving the previous state.
+    """
+
+    def __init__(self, loader, model_dir, on_swap=None):
+        self.loader = loader
+        self.model_dir = model_dir
+        self.on_swap = on_swap
+        self.current = None
+        self.last_error = None
+        self._lock = asyncio.Lock()
+        self._watcher = None
+
+    async def reload(self, loader=None):
+        # `loader` overrides the default one for this load only
+        async with self._lock:
+            try:
+                state = await asyncio.to_thread(loader or self.loader)
+            except Exception as e:
+                self.last_error = str(e)
+                raise
+            previous, self.current = self.current, state
+            self.last_error = None
+            if self.on_swap is not None:
+                self.on_swap(previous, state)
+            return state
+
+    async def _watch(self, interval):
+        # Reload once the files differ from the served state and have stopped
+        # changing for a full interval, so a half-written training run is skipped
+        seen = None
+        failed = None
+        while True:
+            await asyncio.sleep(interval)
+            fingerprint = artifact_fingerprint(self.model_dir)
+            changed = self.current is None or fingerprint != self.current.fingerprint
+            if changed and fingerprint == seen and fingerprint != failed:
+                try:
+                    await self.reload()
+                except Exception as e:
+                    failed = fingerprint
+                    serving = self.current.version if self.current else "nothing"
+                    print(f"Artifact reload failed, still serving {serving}: {e}")
+            seen = fingerprint
+
+    def start_watching(self, interval):
+        # Poll the artifact files and reload when they change
+        if self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(self._watch(interval))
+
+    async def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
@@ -0,0 +1,97 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVF_FILENAME, IVFIndex, load_ivf_index
+from artifacts import StaleArtifactError
+from quantization import CODECS, QUANTIZED_FILENAME, QuantizedIndex, load_quantized_index
+from similarity import SimilarityIndex, normalize_rows
+
+# Minimum recall@10 of each codec's re-ranked results against exact search
+CODEC_RECALL = {"float16": 0.99, "int8": 0.98, "pq": 0.9}
+
+
+def clustered_vectors(rows=3000, dim=32, clusters=24, seed=0):
+    # Normalized vectors around a few directions, like real embeddings
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    return normalize_rows(centers[rng.integers(clusters, size=rows)] + 0.4 * rng.standard_normal((rows, dim)))
+
+
+def recall(found, expected):
+    return np.mean([len(set(f.tolist()) & set(e.tolist())) / len(e) for f, e in zip(found, expected)])
+
+
+class ApproximateSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.vectors = clustered_vectors()
+        self.exact = SimilarityIndex(self.vectors, normalized=True)
+        self.queries = self.vectors[:50] + 0.1 * np.random.default_rng(1).standard_normal((50, self.vectors.shape[1]))
+        self.exclude = [[row] for row in range(50)]
+        self.model_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.model_dir)
+
+    def test_ivf_probing_every_list_is_exact(self):
+        ivf = IVFIndex.build(self.vectors, nlist=16, nprobe=16)
+        mask = np.arange(len(self.vectors)) % 4 != 0
+        for kwargs in ({}, {"exclude": self.exclude}, {"mask": mask}, {"exclude": self.exclude, "mask": mask}):
+            with self.subTest(**{name: True for name in kwargs}):
+                ids, scores = ivf.search_batch(self.queries, 10, **kwargs)
+                expected_ids, expected_scores = self.exact.search_batch(self.queries, 10, **kwargs)
+                for row in range(len(self.queries)):
+                    np.testing.assert_array_equal(ids[row], expected_ids[row])
+                    np.testing.assert_allclose(scores[row], expected_scores[row], rtol=1e-5)
+
+    def test_ivf_default_nprobe_recall(self):
+        ivf = IVFIndex.build(self.vectors, nlist=32, nprobe=8)
+        ids, _ = ivf.search_batch(self.queries, 10)
+        self.assertGreaterEqual(recall(ids, self.exact.search_batch(self.queries, 10)[0]), 0.9)
+
+    def test_codec_recall_after_rerank(self):
+        expected, _ = self.exact.search_batch(self.queries, 10, exclude=self.exclude)
+        for kind in CODECS:
+            with self.subTest(kind=kind):
+                index = QuantizedIndex.build(self.vectors, kind)
+                ids, scores = index.search_batch(self.queries, 10, exclude=self.exclude)
+                self.assertGreaterEqual(recall(ids, expected), CODEC_RECALL[kind])
+                for row, found in enumerate(ids):
+                    self.assertNotIn(row, found.tolist())
+                    # Re-ranked scores are exact cosine similarities, best first
+                    np.testing.assert_allclose(
+                        scores[row], self.vectors[found] @ normalize_rows(self.queries[row:row + 1])[0], rtol=1e-5
+                    )
+                    self.assertTrue(np.all(np.diff(scores[row]) <= 0))
+
+    def test_codec_respects_mask(self):
+        mask = np.zeros(len(self.vectors), dtype=bool)
+        mask[::50] = True
+        for kind in CODECS:
+            with self.subTest(kind=kind):
+                ids, _ = QuantizedIndex.build(self.vectors, kind).search_batch(self.queries, 10, mask=mask)
+                self.assertTrue(all(mask[found].all() and len(found) == 10 for found in ids))
+
+    def test_stale_versions_are_rejected(self):
+        ivf_path = os.path.join(self.model_dir, IVF_FILENAME)
+        IVFIndex.build(self.vectors, nlist=8).save(ivf_path, version="old")
+        with self.assertRaises(StaleArtifactError):
+            IVFIndex.load(ivf_path, self.vectors, version="new")
+        self.assertIsNone(load_ivf_index(self.model_dir, self.vectors, version="new"))
+        self.assertIsNotNone(load_ivf_index(self.model_dir, self.vectors, version="old"))
+
+        quantized_path = os.path.join(self.model_dir, QUANTIZED_FILENAME)
+        QuantizedIndex.build(self.vectors, "int8").save(quantized_path, version="old")
+        with self.assertRaises(StaleArtifactError):
+            QuantizedIndex.load(quantized_path, self.vectors, version="new")
+        self.assertIsNone(load_quantized_index(self.model_dir, self.vectors, version="new"))
+        self.assertIsNotNone(load_quantized_index(self.model_dir, self.vectors, version="old"))
+
+
+if __name__ == "__main__":
+    unittest.main()
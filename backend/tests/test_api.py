@@ -0,0 +1,116 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import main
+from artifacts import write_bundle
+from catalog import Catalog
+from state import load_state
+
+
+def synthetic_state(model_dir, rows=40, dim=16, seed=0):
+    # A small bundle with random embeddings; two titles normalize alike
+    # ("K.G.F: Chapter 1" / "K.G.F Chapter 1") but are different movies
+    rng = np.random.default_rng(seed)
+    titles = ["K.G.F Chapter 1", "K.G.F: Chapter 1"] + [f"Movie {i}" for i in range(rows - 2)]
+    frame = pd.DataFrame({
+        "title": titles,
+        "year": rng.integers(1990, 2025, rows),
+        "genre": [["Action"] if i % 2 else ["Drama", "Comedy"] for i in range(rows)],
+        "industry": ["Bollywood" if i % 3 else "Hollywood" for i in range(rows)],
+        "overview": [f"overview {i}" for i in range(rows)],
+    })
+    write_bundle(model_dir, rng.standard_normal((rows, dim)).astype(np.float32), Catalog.from_dataframe(frame))
+    return load_state(model_dir, load_model=False)
+
+
+class ApiTestCase(unittest.TestCase):
+    """Runs the app against a synthetic state, without the startup load."""
+
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.state = synthetic_state(self.model_dir)
+        self.previous = main.state_manager.current
+        main.state_manager.current = self.state
+        main.result_cache.clear()
+        self.client = TestClient(main.app)
+
+    def tearDown(self):
+        main.state_manager.current = self.previous
+        main.result_cache.clear()
+        shutil.rmtree(self.model_dir)
+
+    def get_titles(self, title, k=3):
+        response = self.client.get("/recommend_by_title", params={"title": title, "k": k})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+class RecommendByTitleTest(ApiTestCase):
+    def test_titles_normalizing_alike_are_cached_apart(self):
+        without_colon = self.get_titles("K.G.F Chapter 1")
+        main.result_cache.clear()
+        with_colon = self.get_titles("K.G.F: Chapter 1")
+        self.assertNotEqual(without_colon, with_colon)
+
+        # Same order with a warm cache: each title still gets its own answer
+        main.result_cache.clear()
+        self.assertEqual(self.get_titles("K.G.F Chapter 1"), without_colon)
+        self.assertEqual(self.get_titles("K.G.F: Chapter 1"), with_colon)
+        self.assertEqual(self.get_titles("K.G.F: Chapter 1"), with_colon)
+
+    def test_unknown_title_is_404(self):
+        response = self.client.get("/recommend_by_title", params={"title": "zzzzqqqq"})
+        self.assertEqual(response.status_code, 404)
+
+
+class RecommendBatchTest(ApiTestCase):
+    def post_batch(self, seeds, **options):
+        response = self.client.post("/recommend/batch", json={"seeds": seeds, **options})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_results_match_the_single_seed_endpoints(self):
+        titles = ["Movie 3", "K.G.F: Chapter 1", "Movie 17"]
+        batch = self.post_batch([{"title": title} for title in titles], k=5)
+        for title, seed in zip(titles, batch["seeds"]):
+            self.assertEqual([movie["title"] for movie in seed["results"]], self.get_titles(title, k=5))
+            single = self.client.get(f"/recommend/{seed['movie_id']}", params={"k": 5}).json()
+            self.assertEqual(seed["results"], single)
+
+    def test_mixed_valid_and_unknown_seeds(self):
+        batch = self.post_batch(
+            [{"title": "Movie 3"}, {"title": "zzzzqqqq"}, {"movie_id": 10_000}, {"movie_id": 7}], k=4
+        )
+        seeds = batch["seeds"]
+        self.assertEqual([seed["movie_id"] for seed in seeds], [self.state.title_index.best_match("Movie 3"), None, None, 7])
+        self.assertEqual([len(seed["results"]) for seed in seeds], [4, 0, 0, 4])
+
+        # The profile comes from the resolved seeds only and never returns them
+        profile_ids = [movie["id"] for movie in batch["profile"]]
+        self.assertEqual(len(profile_ids), 4)
+        self.assertFalse({seeds[0]["movie_id"], 7} & set(profile_ids))
+        only_valid = self.post_batch([{"title": "Movie 3"}, {"movie_id": 7}], k=4)
+        self.assertEqual(batch["profile"], only_valid["profile"])
+
+    def test_non_positive_k_returns_empty_results(self):
+        for k in (0, -3):
+            with self.subTest(k=k):
+                batch = self.post_batch([{"title": "Movie 3"}, {"movie_id": 7}], k=k)
+                self.assertEqual([seed["results"] for seed in batch["seeds"]], [[], []])
+                self.assertEqual(batch["profile"], [])
+
+    def test_too_many_seeds_is_rejected(self):
+        seeds = [{"movie_id": 1}] * (main.BATCH_MAX_SEEDS + 1)
+        self.assertEqual(self.client.post("/recommend/batch", json={"seeds": seeds}).status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from artifacts import BUNDLE_DIRNAME, load_artifact_bundle, publish_bundle, stage_bundle, write_bundle
+from catalog import Catalog
+
+
+def small_frame(rows):
+    return pd.DataFrame({
+        "title": [f"Movie {i}" for i in range(rows)],
+        "year": [2000 + i for i in range(rows)],
+        "genre": [["Drama"]] * rows,
+        "industry": ["Hollywood"] * rows,
+        "overview": [""] * rows,
+    })
+
+
+def small_catalog(rows):
+    return Catalog.from_dataframe(small_frame(rows))
+
+
+class PublishBundleTest(unittest.TestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.rng = np.random.default_rng(0)
+
+    def tearDown(self):
+        shutil.rmtree(self.model_dir)
+
+    def embeddings(self, rows):
+        return self.rng.standard_normal((rows, 4)).astype(np.float32)
+
+    def test_publish_swaps_the_bundle_link(self):
+        first = write_bundle(self.model_dir, self.embeddings(3), small_catalog(3))
+        first_dir = os.path.realpath(os.path.join(self.model_dir, BUNDLE_DIRNAME))
+        second = write_bundle(self.model_dir, self.embeddings(5), small_catalog(5))
+
+        self.assertTrue(os.path.islink(os.path.join(self.model_dir, BUNDLE_DIRNAME)))
+        self.assertFalse(os.path.exists(first_dir))
+        self.assertNotEqual(first["version"], second["version"])
+        bundle = load_artifact_bundle(self.model_dir)
+        self.assertEqual(bundle.version, second["version"])
+        self.assertEqual(len(bundle.catalog), 5)
+
+    def test_old_directory_layout_is_replaced(self):
+        _, staged_dir = stage_bundle(self.model_dir, self.embeddings(3), small_catalog(3))
+        os.rename(staged_dir, os.path.join(self.model_dir, BUNDLE_DIRNAME))
+        manifest = write_bundle(self.model_dir, self.embeddings(4), small_catalog(4))
+
+        self.assertEqual(load_artifact_bundle(self.model_dir).version, manifest["version"])
+        self.assertEqual(
+            sorted(os.listdir(self.model_dir)),
+            [BUNDLE_DIRNAME, os.path.basename(os.path.realpath(os.path.join(self.model_dir, BUNDLE_DIRNAME)))],
+        )
+
+    def test_no_legacy_fallback_while_a_bundle_is_pending(self):
+        # Legacy pickles present, a bundle staged but not yet published
+        small_frame(3).to_pickle(os.path.join(self.model_dir, "movies_metadata.pkl"))
+        pd.to_pickle(self.embeddings(3), os.path.join(self.model_dir, "embeddings.pkl"))
+        self.assertTrue(load_artifact_bundle(self.model_dir).version.startswith("legacy-"))
+
+        _, staged_dir = stage_bundle(self.model_dir, self.embeddings(3), small_catalog(3))
+        with self.assertRaises(ValueError):
+            load_artifact_bundle(self.model_dir)
+        publish_bundle(self.model_dir, staged_dir)
+        self.assertFalse(load_artifact_bundle(self.model_dir).version.startswith("legacy-"))
+
+
+if __name__ == "__main__":
+    unittest.main()
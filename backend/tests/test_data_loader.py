@@ -0,0 +1,184 @@
+import hashlib
+import http.server
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import data_loader
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class FixtureServer(http.server.ThreadingHTTPServer):
+    """Local stand-in for the dataset host.
+
+    Serves the fixture CSVs with an ETag, answers If-None-Match with 304 and
+    Range / If-Range with 206, and records every request. `truncate` maps a
+    path to the number of bytes sent before the connection is dropped (once);
+    `fail` makes every request a 503.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.log = [] # (path, request headers, status)
+        self.truncate = {}
+        self.fail = False
+        super().__init__(("127.0.0.1", 0), _FixtureHandler)
+
+    def url(self, name):
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+    def statuses(self):
+        return [status for _, _, status in self.log]
+
+
+class _FixtureHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _record(self, status):
+        self.server.log.append((self.path, dict(self.headers), status))
+
+    def do_GET(self):
+        server = self.server
+        path = os.path.join(server.directory, os.path.basename(self.path))
+        if server.fail or not os.path.exists(path):
+            status = 503 if server.fail else 404
+            self._record(status)
+            self.send_error(status)
+            return
+        with open(path, "rb") as f:
+            body = f.read()
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+        if self.headers.get("If-None-Match") == etag:
+            self._record(304)
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        if self.headers.get("Range") and self.headers.get("If-Range", etag) == etag:
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+        payload = body[start:]
+        status = 206 if start else 200
+        self._record(status)
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(payload)))
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        cut = server.truncate.pop(self.path, None)
+        if cut is None:
+            self.wfile.write(payload)
+        else:
+            self.wfile.write(payload[:cut])
+            self.wfile.flush()
+            self.close_connection = True
+
+
+class DataLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        cache_dir = os.path.join(self.tmp, "cache")
+        for name, value in [("CACHE_DIR", cache_dir), ("CACHE_INDEX", os.path.join(cache_dir, "index.json"))]:
+            patcher = mock.patch.object(data_loader, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.server = FixtureServer(FIXTURES)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.urls = {"Action": self.server.url("action.csv"), "Comedy": self.server.url("comedy.csv")}
+        self.output = os.path.join(self.tmp, "data", "movies.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def merge(self):
+        with mock.patch("builtins.print"):
+            data_loader.download_and_merge(self.urls, self.output)
+        return pd.read_csv(self.output)
+
+    def test_unchanged_sources_are_skipped_with_etag(self):
+        first = self.merge()
+        self.assertEqual(self.server.statuses(), [200, 200])
+        mtime = os.path.getmtime(self.output)
+
+        second = self.merge()
+        revalidations = self.server.log[2:]
+        self.assertEqual([status for _, _, status in revalidations], [304, 304])
+        self.assertTrue(all("If-None-Match" in headers for _, headers, _ in revalidations))
+        # Nothing changed, so the merged output is not rewritten either
+        self.assertEqual(os.path.getmtime(self.output), mtime)
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_interrupted_download_resumes_with_range(self):
+        os.makedirs(data_loader.CACHE_DIR)
+        self.server.truncate["/action.csv"] = 100
+        with self.assertRaises(Exception):
+            data_loader.fetch_source("Action", self.urls["Action"], None)
+
+        path, entry, changed = data_loader.fetch_source("Action", self.urls["Action"], None)
+        _, headers, status = self.server.log[-1]
+        self.assertEqual(status, 206)
+        self.assertEqual(headers["Range"], "bytes=100-")
+        self.assertTrue(changed)
+        with open(path, "rb") as cached, open(os.path.join(FIXTURES, "action.csv"), "rb") as original:
+            self.assertEqual(cached.read(), original.read())
+        self.assertEqual(entry["sha256"], data_loader._sha256(path))
+        self.assertFalse(os.path.exists(path + ".part"))
+
+    def test_offline_falls_back_to_cached_sources(self):
+        online = self.merge()
+        os.remove(self.output)
+        self.server.fail = True
+
+        offline = self.merge()
+        self.assertEqual(self.server.statuses()[-2:], [503, 503])
+        pd.testing.assert_frame_equal(online, offline)
+
+    def test_duplicate_titles_keep_last(self):
+        movies = self.merge()
+        titles = movies["title"].fillna("").tolist()
+        self.assertEqual(len(titles), len(set(titles)))
+        # Last across files, and the augmented rows come after every source
+        self.assertEqual(movies.loc[movies["title"] == "Duplicate Title", "year"].tolist(), [2010])
+        rrr = movies[movies["title"] == "RRR"]
+        self.assertEqual(rrr[["year", "industry"]].values.tolist(), [[2022, "Tollywood"]])
+
+    def test_drop_duplicate_titles_matches_pandas_and_streams(self):
+        frame = pd.DataFrame({
+            "title": ["a", "b", "a", None, "c", "b", "d", None, "a", "e"],
+            "year": range(10),
+        })
+        chunks = [frame.iloc[i:i + 3] for i in range(0, len(frame), 3)]
+        reads = []
+
+        def make_chunks():
+            for i, chunk in enumerate(chunks):
+                reads.append(i)
+                yield chunk
+
+        stream = data_loader.drop_duplicate_titles(make_chunks)
+        first = next(stream)
+        # The second pass hands out the first chunk before reading any other
+        self.assertEqual(reads, [0, 1, 2, 3, 0])
+        merged = pd.concat([first, *stream])
+        pd.testing.assert_frame_equal(merged, frame.drop_duplicates(subset=["title"], keep="last"))
+
+
+if __name__ == "__main__":
+    unittest.main()
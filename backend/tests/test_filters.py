@@ -0,0 +1,105 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ann_index import IVFIndex
+from catalog import Catalog
+from filters import FilterIndex
+from quantization import QuantizedIndex
+from similarity import SimilarityIndex, normalize_rows
+
+INDUSTRIES = ["Hollywood", "Bollywood", "Tollywood", None]
+GENRES = ["Action", "Drama", "Comedy", "Science Fiction", "Horror"]
+
+FILTERS = [
+    {"industry": "wood"},
+    {"industry": "bolly"},
+    {"genres": ["action"]},
+    {"genres": ["Drama", "Horror"]},
+    {"year_min": 1995},
+    {"year_max": 1983},
+    {"year_min": 1987, "year_max": 2012},
+    {"industry": "Hollywood", "genres": ["Comedy", "Action"], "year_min": 2000},
+    {"industry": "tolly", "year_max": 2005},
+]
+
+
+def matches(record, industry=None, genres=None, year_min=None, year_max=None):
+    # The filter semantics, one row at a time
+    if industry is not None and (record["industry"] is None or industry.casefold() not in record["industry"].casefold()):
+        return False
+    if genres and not {g.casefold() for g in genres} & {g.casefold() for g in record["genre"] or []}:
+        return False
+    if year_min is not None or year_max is not None:
+        if record["year"] is None:
+            return False
+        if (year_min is not None and record["year"] < year_min) or (year_max is not None and record["year"] > year_max):
+            return False
+    return True
+
+
+class FilterIndexTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        rows = 400
+        self.records = [
+            {
+                "title": f"Movie {i}",
+                "year": None if i % 17 == 0 else int(rng.integers(1975, 2025)),
+                "genre": None if i % 23 == 0 else list(rng.choice(GENRES, rng.integers(1, 3), replace=False)),
+                "industry": INDUSTRIES[i % len(INDUSTRIES)],
+                "overview": "",
+            }
+            for i in range(rows)
+        ]
+        self.filters = FilterIndex(Catalog.from_dataframe(pd.DataFrame(self.records)))
+        self.vectors = normalize_rows(rng.standard_normal((rows, 16)))
+        self.queries = normalize_rows(rng.standard_normal((8, 16)))
+
+    def expected_mask(self, **filters):
+        return np.array([matches(record, **filters) for record in self.records])
+
+    def test_masks_match_row_by_row_filtering(self):
+        for filters in FILTERS:
+            with self.subTest(**filters):
+                np.testing.assert_array_equal(self.filters.mask(**filters), self.expected_mask(**filters))
+
+    def test_masked_search_equals_filtered_brute_force(self):
+        index = SimilarityIndex(self.vectors, normalized=True)
+        for filters in FILTERS:
+            with self.subTest(**filters):
+                mask = self.filters.mask(**filters)
+                ids, _ = index.search_batch(self.queries, 10, mask=mask)
+                allowed = np.flatnonzero(self.expected_mask(**filters))
+                for query, found in zip(self.queries, ids):
+                    ranking = allowed[np.argsort(-(self.vectors[allowed] @ query), kind="stable")]
+                    np.testing.assert_array_equal(found, ranking[:10])
+
+    def test_empty_mask_returns_nothing(self):
+        mask = self.filters.mask(genres=["Western"])
+        self.assertFalse(mask.any())
+        for ann in (None, IVFIndex.build(self.vectors, nlist=8), QuantizedIndex.build(self.vectors, "int8")):
+            with self.subTest(ann=type(ann).__name__):
+                index = SimilarityIndex(self.vectors, ann=ann, normalized=True)
+                ids, scores = index.search_batch(self.queries, 10, mask=mask)
+                self.assertEqual([found.tolist() for found in ids], [[]] * len(self.queries))
+                self.assertEqual(index.search_by_id(0, 5, mask=mask)[0].tolist(), [])
+
+    def test_masks_are_cached_and_read_only(self):
+        self.assertIsNone(self.filters.mask())
+        first = self.filters.mask(genres=["Drama", "action"], year_min=1990)
+        second = self.filters.mask(genres=["ACTION", "drama"], year_min=1990)
+        # Genre order and case do not matter for the cache key
+        self.assertIs(first, second)
+        self.assertEqual(self.filters._mask.cache_info().hits, 1)
+        self.assertIsNot(self.filters.mask(genres=["Drama"], year_min=1990), first)
+        with self.assertRaises(ValueError):
+            first[0] = not first[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
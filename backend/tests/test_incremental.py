@@ -0,0 +1,102 @@
+import contextlib
+import io
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import torch
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import MinMaxScaler, MultiLabelBinarizer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from artifacts import load_artifact_bundle, write_bundle
+from catalog import Catalog
+from features import Featurizer
+from incremental import incremental_update
+from inference import EncoderInference
+from model import MovieRecommenderNet, prepare_frame
+from neighbours import NEIGHBOURS_FILENAME, build_neighbour_table, load_neighbour_table, save_neighbour_table
+
+WORDS = ["heist", "love", "war", "space", "ghost", "city", "river", "king", "robot", "storm", "family", "secret"]
+GENRES = ["Action", "Drama", "Comedy", "Thriller"]
+
+
+def movie_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "title": [f"Movie {i}" for i in range(rows)],
+        "year": rng.integers(1980, 2020, rows),
+        "genre": [", ".join(rng.choice(GENRES, rng.integers(1, 3), replace=False)) for _ in range(rows)],
+        "industry": rng.choice(["Hollywood", "Bollywood"], rows),
+        "overview": [" ".join(rng.choice(WORDS, 8)) for _ in range(rows)],
+    })
+
+
+def write_trained_artifacts(model_dir, frame):
+    # What model.py leaves behind, with an untrained (random) encoder
+    df = prepare_frame(frame.copy())
+    tfidf = TfidfVectorizer().fit(df["overview"])
+    mlb = MultiLabelBinarizer().fit(df["genre"])
+    scaler = MinMaxScaler().fit(df[["year"]])
+    for name, preprocessor in (("tfidf", tfidf), ("mlb", mlb), ("scaler", scaler)):
+        with open(os.path.join(model_dir, f"{name}.pkl"), "wb") as f:
+            pickle.dump(preprocessor, f)
+    featurizer = Featurizer(tfidf, mlb, scaler)
+    torch.manual_seed(0)
+    state_dict = MovieRecommenderNet(featurizer.input_dim, 16).state_dict()
+    torch.save(state_dict, os.path.join(model_dir, "model.pt"))
+
+    embeddings = EncoderInference(state_dict).embed(
+        featurizer.transform(df["overview"].tolist(), df["genre"].tolist(), df["year"].tolist())
+    )
+    catalog = Catalog.from_dataframe(df)
+    manifest = write_bundle(model_dir, embeddings, catalog, content_hashes=catalog.content_hashes())
+    save_neighbour_table(model_dir, build_neighbour_table(embeddings), version=manifest["version"])
+
+
+class IncrementalUpdateTest(unittest.TestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.model_dir, "movies.csv")
+        self.frame = movie_frame(80)
+        write_trained_artifacts(self.model_dir, self.frame)
+
+    def tearDown(self):
+        shutil.rmtree(self.model_dir)
+
+    def update(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return incremental_update(self.model_dir, self.data_path)
+
+    def test_neighbours_match_a_full_rebuild_and_rerun_is_a_no_op(self):
+        # One new movie and one changed overview
+        frame = pd.concat([self.frame, movie_frame(1, seed=1).assign(title="Brand New")], ignore_index=True)
+        frame.loc[5, "overview"] = "robot robot space war secret"
+        frame.to_csv(self.data_path, index=False)
+
+        report = self.update()
+        self.assertEqual(report["rows"], 2)
+        bundle = load_artifact_bundle(self.model_dir)
+        self.assertEqual(len(bundle.catalog), 81)
+        self.assertEqual(bundle.catalog.titles([80]), ["Brand New"])
+
+        table = load_neighbour_table(self.model_dir, version=bundle.version)
+        expected = build_neighbour_table(np.asarray(bundle.embeddings))
+        np.testing.assert_array_equal(table.scores, expected.scores)
+        np.testing.assert_array_equal(table.ids, expected.ids)
+
+        # Nothing left to do: no rows embedded, no files rewritten
+        neighbours_mtime = os.stat(os.path.join(self.model_dir, NEIGHBOURS_FILENAME)).st_mtime_ns
+        report = self.update()
+        self.assertEqual(report["rows"], 0)
+        self.assertEqual(load_artifact_bundle(self.model_dir).version, bundle.version)
+        self.assertEqual(os.stat(os.path.join(self.model_dir, NEIGHBOURS_FILENAME)).st_mtime_ns, neighbours_mtime)
+
+
+if __name__ == "__main__":
+    unittest.main()
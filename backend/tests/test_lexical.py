@@ -0,0 +1,88 @@
+import math
+import os
+import sys
+import unittest
+from collections import Counter
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from lexical import BM25_B, BM25_K1, LexicalIndex
+
+WORDS = ["heist", "love", "war", "space", "ghost", "city", "river", "king", "robot", "storm"]
+
+
+def brute_force_bm25(documents, analyze, query, k1=BM25_K1, b=BM25_B):
+    # Every document scored from scratch, with no postings or pruning
+    tokens = [analyze(document) for document in documents]
+    average = sum(map(len, tokens)) / len(tokens) or 1.0
+    df = Counter(token for doc in tokens for token in set(doc))
+    scores = np.zeros(len(documents))
+    for term, query_count in Counter(analyze(query)).items():
+        if term not in df:
+            continue
+        idf = math.log1p((len(documents) - df[term] + 0.5) / (df[term] + 0.5))
+        for row, doc in enumerate(tokens):
+            tf = doc.count(term)
+            if tf:
+                scores[row] += query_count * idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / average))
+    return scores
+
+
+class MaxScoreTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.documents = [" ".join(rng.choice(WORDS, rng.integers(1, 12))) for _ in range(300)]
+        # Identical documents tie on every query
+        self.documents += ["heist city king"] * 5 + ["storm storm river"] * 5
+        self.index = LexicalIndex(self.documents)
+
+    def check(self, query, k, mask=None):
+        terms, query_weights = self.index.query_terms(query)
+        ids, scores, _ = self.index.search(terms, query_weights, k, mask=mask)
+
+        expected = brute_force_bm25(self.documents, self.index.analyze, query)
+        matching = np.flatnonzero((expected > 0) & (True if mask is None else mask))
+        best = np.sort(expected[matching])[::-1][:k]
+        # Ties may be broken either way; the scores must be the exhaustive top k
+        self.assertEqual(len(ids), min(k, len(matching)))
+        self.assertEqual(len(set(ids.tolist())), len(ids))
+        np.testing.assert_allclose(scores, best, rtol=1e-5)
+        np.testing.assert_allclose(expected[ids], scores, rtol=1e-5)
+        if mask is not None:
+            self.assertTrue(mask[ids].all())
+
+    def test_matches_exhaustive_scoring(self):
+        for query in ["heist", "love war", "ghost city river", "space robot storm king", "war war love"]:
+            for k in (1, 3, 10, 50):
+                with self.subTest(query=query, k=k):
+                    self.check(query, k)
+
+    def test_ties(self):
+        # The five copies of each repeated document tie at the top
+        for query, k in [("heist city king", 3), ("heist city king", 7), ("storm river", 2)]:
+            with self.subTest(query=query, k=k):
+                self.check(query, k)
+
+    def test_k_larger_than_matches(self):
+        index = LexicalIndex(["red fox", "blue fox", "green owl", "red owl"])
+        terms, query_weights = index.query_terms("fox")
+        ids, scores, _ = index.search(terms, query_weights, 10)
+        self.assertEqual(sorted(ids.tolist()), [0, 1])
+        self.check("ghost", len(self.documents) * 2)
+
+    def test_mask(self):
+        mask = np.arange(len(self.documents)) % 3 == 0
+        for query in ["heist city", "storm", "love space robot"]:
+            with self.subTest(query=query):
+                self.check(query, 5, mask=mask)
+
+    def test_no_known_terms_or_k_zero(self):
+        terms, query_weights = self.index.query_terms("unknownword")
+        self.assertEqual(len(self.index.search(terms, query_weights, 5)[0]), 0)
+        terms, query_weights = self.index.query_terms("heist")
+        self.assertEqual(len(self.index.search(terms, query_weights, 0)[0]), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import bisect
+import difflib
+import re
+from collections import defaultdict
+
+import numpy as np
+
+FUZZY_CANDIDATES = 20
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_title(title):
+    # Case-fold and collapse punctuation/whitespace: "K.G.F: Chapter 1" -> "k g f chapter 1"
+    if not isinstance(title, str):
+        return ""
+    return _NON_ALNUM.sub(" ", title.casefold()).strip()
+
+
+def ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def trigrams(text, pad=True):
+    if pad:
+        text = f" {text} "
+    return ngrams(text, 3)
+
+
+class TitleIndex:
+    """Startup-built lookup structures for movie titles.
+
+    - raw: title as stored -> first movie id, so an exact title wins over
+      others that only normalize to the same text ("K.G.F: Chapter 1" vs
+      "K.G.F Chapter 1")
+    - exact: normalized title -> movie ids
+    - sorted normalized titles for prefix lookup with bisect
+    - trigram inverted index for substring and fuzzy matching, plus 1- and
+      2-gram postings so very short queries are lookups rather than scans
+
+    Queries only touch the postings of their own trigrams, so lookups stay
+    fast regardless of catalog size.
+    """
+
+    def __init__(self, titles):
+        self.normalized = [normalize_title(t) for t in titles]
+        self.raw = {}
+        for movie_id, title in enumerate(titles):
+            if isinstance(title, str):
+                self.raw.setdefault(title, movie_id)
+
+        exact = defaultdict(list)
+        postings = defaultdict(list)
+        short_postings = defaultdict(list)
+        self.trigram_counts = np.zeros(len(self.normalized), dtype=np.int32)
+        for movie_id, title in enumerate(self.normalized):
+            if not title:
+                continue
+            exact[title].append(movie_id)
+            grams = trigrams(title)
+            self.trigram_counts[movie_id] = len(grams)
+            for gram in grams:
+                postings[gram].append(movie_id)
+            for gram in ngrams(title, 1) | ngrams(title, 2):
+                short_postings[gram].append(movie_id)
+
+        self.exact = {t: np.array(ids, dtype=np.int64) for t, ids in exact.items()}
+        # Ids are appended in increasing order, so every posting list is sorted
+        self.postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+        self.short_postings = {g: np.array(ids, dtype=np.int32) for g, ids in short_postings.items()}
+        # Ids laid out in sorted-title order, so a prefix range is one slice
+        self.sorted_titles = sorted(exact)
+        self.sorted_ids = np.concatenate(
+            [self.exact[t] for t in self.sorted_titles] or [np.empty(0, dtype=np.int64)]
+        )
+        self.sorted_offsets = np.cumsum([0] + [len(self.exact[t]) for t in self.sorted_titles])
+
+    def __len__(self):
+        return len(self.normalized)
+
+    def lookup(self, title):
+        return self.exact.get(normalize_title(title), np.empty(0, dtype=np.int64))
+
+    def prefix(self, query):
+        # Ids of every title starting with the normalized query, in id order
+        query = normalize_title(query)
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        start = bisect.bisect_left(self.sorted_titles, query)
+        end = bisect.bisect_left(self.sorted_titles, query + "\U0010ffff", lo=start)
+        return np.sort(self.sorted_ids[self.sorted_offsets[start]:self.sorted_offsets[end]])
+
+    def contains(self, query):
+        # Ids of every title containing the normalized query, in id order.
+        # A query with no letters or digits (e.g. "%") matches nothing
+        query = normalize_title(query)
+        if not query:
+            return np.empty(0, dtype=np.int64)
+        if len(query) < 3:
+            return self.short_postings.get(query, np.empty(0, dtype=np.int64)).astype(np.int64)
+        if len(query) == 3:
+            return self.postings.get(query, np.empty(0, dtype=np.int64)).astype(np.int64)
+
+        lists = []
+        for gram in trigrams(query, pad=False):
+            posting = self.postings.get(gram)
+            if posting is None:
+                return np.empty(0, dtype=np.int64)
+            lists.append(posting)
+        lists.sort(key=len)
+        candidates = lists[0]
+        for posting in lists[1:]:
+            candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if len(candidates) == 0:
+                break
+        # Trigram overlap is necessary but not sufficient; verify the survivors
+        return np.array(
+            [i for i in candidates if query in self.normalized[i]], dtype=np.int64
+        )
+
+    def search(self, query):
+        """Substring search ranked as exact > prefix > contains, then by id.
+
+        Among exact matches, the title equal to the raw query comes first.
+        """
+        raw = query
+        query = normalize_title(query)
+        matches = self.contains(query)
+        if len(matches) == 0:
+            return matches
+        rank = np.full(len(matches), 3, dtype=np.int8)
+        rank[np.isin(matches, self.prefix(query), assume_unique=True)] = 2
+        rank[np.isin(matches, self.lookup(query), assume_unique=True)] = 1
+        rank[matches == self.raw.get(raw, -1)] = 0
+        return matches[np.argsort(rank, kind="stable")]
+
+    def fuzzy(self, query, n=5, cutoff=0.6):
+        """Closest titles by edit similarity, like difflib.get_close_matches.
+
+        Candidates are the titles sharing the most trigrams with the query;
+        only those few are re-ranked with difflib.
+        """
+        query = normalize_title(query)
+        if not query:
+            return []
+        grams = trigrams(query)
+        lists = [self.postings[g] for g in grams if g in self.postings]
+        if not lists:
+            return []
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.normalized))
+        dice = 2 * shared / (len(grams) + np.maximum(self.trigram_counts, 1))
+        candidates = np.flatnonzero(shared)
+        if len(candidates) > FUZZY_CANDIDATES:
+            keep = np.argpartition(-dice[candidates], FUZZY_CANDIDATES - 1)[:FUZZY_CANDIDATES]
+            candidates = candidates[keep]
+
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        scored = []
+        for movie_id in candidates:
+            matcher.set_seq1(self.normalized[movie_id])
+            ratio = matcher.ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, int(movie_id)))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [movie_id for _, movie_id in scored[:n]]
+
+    def best_match(self, query, cutoff=0.6):
+        # Exact raw title, then normalized exact title, then first prefix
+        # hit, then closest fuzzy match, then first substring hit
+        movie_id = self.raw.get(query) if isinstance(query, str) else None
+        if movie_id is not None:
+            return movie_id
+        exact = self.lookup(query)
+        if len(exact):
+            return int(exact[0])
+        prefixed = self.prefix(query)
+        if len(prefixed):
+            return int(prefixed[0])
+        fuzzy = self.fuzzy(query, n=1, cutoff=cutoff)
+        if fuzzy:
+            return fuzzy[0]
+        contained = self.contains(query)
+        if len(contained):
+            return int(contained[0])
+        return None
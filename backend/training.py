@@ -0,0 +1,220 @@
+import math
+import os
+import socket
+import tempfile
+import time
+from dataclasses import dataclass
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import BatchSampler, DataLoader, Dataset, DistributedSampler, RandomSampler
+
+# Configuration
+EPOCHS = 5
+BATCH_SIZE = 64
+BASE_LR = 0.001 # Learning rate tuned for BASE_BATCH_SIZE
+BASE_BATCH_SIZE = 64
+NUM_WORKERS = 2 # DataLoader worker processes densifying mini-batches
+PREFETCH_FACTOR = 4 # Batches each worker prepares ahead
+LR_SCALING = ("none", "linear", "sqrt")
+PRECISIONS = ("auto", "bf16", "fp32")
+
+
+@dataclass
+class TrainConfig:
+    """Knobs for `fit`. Thread counts of 0 keep torch's defaults."""
+
+    epochs: int = EPOCHS
+    batch_size: int = BATCH_SIZE # Global batch, split across DDP processes
+    base_lr: float = BASE_LR
+    base_batch_size: int = BASE_BATCH_SIZE
+    lr_scaling: str = "sqrt" # Adam tolerates sqrt scaling better than linear
+    num_workers: int = NUM_WORKERS
+    prefetch_factor: int = PREFETCH_FACTOR
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    precision: str = "auto"
+    world_size: int = 1 # > 1 trains with DistributedDataParallel over gloo
+    seed: int = 0
+
+    @property
+    def lr(self):
+        ratio = self.batch_size / self.base_batch_size
+        if self.lr_scaling == "linear":
+            return self.base_lr * ratio
+        if self.lr_scaling == "sqrt":
+            return self.base_lr * math.sqrt(ratio)
+        return self.base_lr
+
+
+class SparseRowDataset(Dataset):
+    """Rows of a CSR feature matrix, densified one mini-batch at a time.
+
+    Indexed with a list of row ids (use with a BatchSampler and
+    batch_size=None), so only batch_size x input_dim floats are ever dense.
+    """
+
+    def __init__(self, features):
+        self.features = features
+
+    def __len__(self):
+        return self.features.shape[0]
+
+    def __getitem__(self, indices):
+        return torch.from_numpy(self.features[indices].toarray())
+
+
+def configure_threads(intra_op_threads=0, inter_op_threads=0):
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError:
+            # Only settable before the first inter-op parallel work
+            print("Inter-op threads already initialized, keeping", torch.get_num_interop_threads())
+
+
+def bf16_supported():
+    # Native bf16 matmuls (AVX512-BF16 / AMX); elsewhere bf16 is emulated and slower
+    check = getattr(torch.cpu, "_is_avx512_bf16_supported", None)
+    return bool(check and check())
+
+
+def resolve_precision(precision, device):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+    if device.type != "cpu":
+        return "fp32"
+    if precision == "auto":
+        return "bf16" if bf16_supported() else "fp32"
+    return precision
+
+
+def _make_loader(features, config, rank=0, world_size=1):
+    dataset = SparseRowDataset(features)
+    if world_size > 1:
+        sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank, shuffle=True, seed=config.seed)
+    else:
+        sampler = RandomSampler(dataset, generator=torch.Generator().manual_seed(config.seed))
+    batch_size = max(1, config.batch_size // world_size)
+    loader = DataLoader(
+        dataset,
+        sampler=BatchSampler(sampler, batch_size=batch_size, drop_last=False),
+        batch_size=None,
+        num_workers=config.num_workers,
+        prefetch_factor=config.prefetch_factor if config.num_workers > 0 else None,
+        persistent_workers=config.num_workers > 0,
+        pin_memory=torch.cuda.is_available(),
+    )
+    return loader, sampler
+
+
+def _train_epochs(model, features, config, device, rank=0, world_size=1):
+    # The training loop shared by single-process and DDP runs; returns the
+    # per-epoch history (identical on every rank)
+    loader, sampler = _make_loader(features, config, rank, world_size)
+    precision = resolve_precision(config.precision, device)
+    criterion = nn.MSELoss()
+    optimizer = optim.Adam(model.parameters(), lr=config.lr)
+    if rank == 0:
+        print(
+            f"Training on {device}: batch {config.batch_size}, lr {config.lr:.5f}, {precision}, "
+            f"{torch.get_num_threads()} threads x {world_size} processes, {config.num_workers} loader workers"
+        )
+
+    history = []
+    model.train()
+    for epoch in range(config.epochs):
+        if world_size > 1:
+            sampler.set_epoch(epoch)
+        start = time.perf_counter()
+        total_loss = 0.0
+        batches = 0
+        samples = 0
+        for batch in loader:
+            inputs = batch.to(device, non_blocking=True)
+
+            optimizer.zero_grad()
+            with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=precision == "bf16"):
+                reconstructed, _ = model(inputs)
+                loss = criterion(reconstructed.float(), inputs)
+            loss.backward()
+            optimizer.step()
+
+            total_loss += loss.item()
+            batches += 1
+            samples += len(inputs)
+
+        totals = torch.tensor([total_loss, batches, samples], dtype=torch.float64)
+        if world_size > 1:
+            dist.all_reduce(totals)
+        seconds = time.perf_counter() - start
+        stats = {
+            "epoch": epoch + 1,
+            "loss": totals[0].item() / max(totals[1].item(), 1),
+            "seconds": seconds,
+            "samples_per_sec": totals[2].item() / seconds,
+        }
+        history.append(stats)
+        if rank == 0:
+            print(
+                f"Epoch {stats['epoch']}/{config.epochs}, Loss: {stats['loss']:.4f}, "
+                f"{stats['seconds']:.1f}s, {stats['samples_per_sec']:.0f} samples/s"
+            )
+    return history
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _ddp_worker(rank, model, features, config, port, result_path):
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", rank=rank, world_size=config.world_size)
+    try:
+        # Split the cores between processes unless told otherwise
+        configure_threads(
+            config.intra_op_threads or max(1, (os.cpu_count() or 1) // config.world_size),
+            config.inter_op_threads,
+        )
+        torch.manual_seed(config.seed)
+        device = torch.device("cpu")
+        history = _train_epochs(DistributedDataParallel(model), features, config, device, rank, config.world_size)
+        if rank == 0:
+            torch.save({"state_dict": model.state_dict(), "history": history}, result_path)
+    finally:
+        dist.destroy_process_group()
+
+
+def fit(model, features, config=None, device=torch.device("cpu")):
+    """Train `model` in place to reconstruct the sparse `features`.
+
+    Returns the per-epoch history: loss, wall seconds and samples/sec. With
+    world_size > 1, local processes each train on a shard of every epoch
+    (CPU only) and the rank 0 weights are loaded back into `model`.
+    """
+    config = config or TrainConfig()
+    if config.world_size <= 1:
+        configure_threads(config.intra_op_threads, config.inter_op_threads)
+        torch.manual_seed(config.seed)
+        return _train_epochs(model.to(device), features, config, device)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_path = os.path.join(tmp_dir, "result.pt")
+        mp.spawn(
+            _ddp_worker,
+            args=(model.cpu(), features, config, _free_port(), result_path),
+            nprocs=config.world_size,
+            join=True,
+        )
+        result = torch.load(result_path)
+    model.load_state_dict(result["state_dict"])
+    return result["history"]
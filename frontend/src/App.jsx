@@ -99,28 +99,23 @@ function App() {
           // --- 1. PLOT MATCHES (Neural Network) ---
           const nnTitles = new Set();
           if (seedMovies.length > 0) {
-            for (const seed of seedMovies) {
-              try {
-                // Try finding by title first (Local DB match)
-                const res = await axios.get(`${API_URL}/recommend_by_title`, {
-                  params: { title: seed.title, k: 10 }
-                });
-                res.data.forEach(t => nnTitles.add(t));
-              } catch (e) {
-                console.log(`Backend match failed for ${seed.title}, trying On-the-fly Embedding...`);
-                // Fallback: Use On-the-fly Embedding with Plot
-                try {
-                  const res = await axios.post(`${API_URL}/recommend_by_plot`, {
-                    overview: seed.overview || "",
-                    year: parseInt(seed.year) || 2024,
-                    genres: seed.genre || [], // Ensure this matches what TMDB returns (names or IDs? TMDB returns IDs usually, need names for backend?)
-                    k: 10
-                  });
-                  res.data.forEach(t => nnTitles.add(t));
-                } catch (e2) {
-                  console.error(`On-the-fly embedding failed for ${seed.title}`, e2);
-                }
-              }
+            // One batch request for all seeds: each is matched by title in the
+            // local DB, falling back to an on-the-fly embedding of its plot
+            try {
+              const res = await axios.post(`${API_URL}/recommend/batch`, {
+                seeds: seedMovies.map(seed => ({
+                  title: seed.title,
+                  overview: seed.overview || "",
+                  year: parseInt(seed.year) || 2024,
+                  // TMDB returns genre IDs; the backend only understands genre names
+                  genres: (seed.genre || []).filter(g => typeof g === 'string'),
+                })),
+                k: 10,
+                profile: false
+              });
+              res.data.seeds.forEach(s => s.results.forEach(m => nnTitles.add(m.title)));
+            } catch (e) {
+              console.error("Batch recommendation failed", e);
             }
           }
 